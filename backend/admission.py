@@ -0,0 +1,186 @@
+"""Admission control for the write-heavy ingestion endpoints.
+
+Two mechanisms guard every protected route:
+
+* a token bucket per (user, route), which bounds each client's request
+  rate; a request finding the bucket empty gets ``429`` and a
+  ``Retry-After`` of the time until the next token;
+* a concurrency limit per route group (a semaphore plus a bounded wait
+  queue), which bounds the MongoDB work in flight. A request finding the
+  queue full, or not reaching the front in time, gets ``503`` and a
+  ``Retry-After`` estimated from the recent service time.
+
+Rejecting early keeps connection-pool checkouts available to the dashboard
+reads during ingest bursts. The limits apply per worker process.
+"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+
+@dataclass
+class Policy:
+    rate: float            # sustained requests per second per user
+    burst: int             # bucket capacity
+    group: str             # concurrency group shared by related routes
+    max_concurrent: int    # requests of the group in flight
+    max_queue: int         # requests of the group waiting for a slot
+    queue_timeout: float = 2.0
+
+
+def policy_from_env(name: str, default: Policy) -> Policy:
+    """Override a policy with ``ADMISSION_<NAME>_RATE|BURST|CONCURRENCY|QUEUE`` env vars."""
+    prefix = f'ADMISSION_{name.upper()}_'
+    return Policy(
+        rate=float(os.environ.get(prefix + 'RATE', default.rate)),
+        burst=int(os.environ.get(prefix + 'BURST', default.burst)),
+        group=default.group,
+        max_concurrent=int(os.environ.get(prefix + 'CONCURRENCY', default.max_concurrent)),
+        max_queue=int(os.environ.get(prefix + 'QUEUE', default.max_queue)),
+        queue_timeout=float(os.environ.get(prefix + 'QUEUE_TIMEOUT', default.queue_timeout)),
+    )
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token; returns 0 when admitted, else the seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    """Token buckets keyed by (user, route); idle full buckets are dropped."""
+
+    def __init__(self, max_buckets: int = 10000):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+
+    def check(self, key: Hashable, policy: Policy):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(policy.rate, policy.burst, now)
+        wait = bucket.take(now)
+        if wait:
+            raise Rejected(429, wait, "Rate limit exceeded")
+
+    def _prune(self, now: float):
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity:
+                del self._buckets[key]
+
+
+class ConcurrencyLimit:
+    """Semaphore with a bounded wait queue and a service-time estimate for Retry-After."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.service_time = 0.1  # EWMA of seconds per request
+
+    def _retry_after(self) -> float:
+        return self.service_time * (self.waiting + 1) / self.max_concurrent
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Rejected(503, self._retry_after(), "Server busy, queue full")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Rejected(503, self._retry_after(), "Server busy, queued too long")
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.service_time += 0.2 * (time.monotonic() - started - self.service_time)
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'rejected': self.rejected,
+            'service_time_ms': round(self.service_time * 1000, 2),
+        }
+
+
+class AdmissionController:
+    def __init__(self, policies: Dict[str, Policy], enabled: bool = True):
+        self.policies = policies
+        self.enabled = enabled
+        self.rate_limiter = RateLimiter()
+        self.throttled = 0
+        self.groups: Dict[str, ConcurrencyLimit] = {}
+        for policy in policies.values():
+            # The first route of a group sets its limits
+            self.groups.setdefault(
+                policy.group, ConcurrencyLimit(policy.max_concurrent, policy.max_queue, policy.queue_timeout)
+            )
+
+    @asynccontextmanager
+    async def admit(self, route: str, user_id: Optional[str]):
+        """Hold an admission slot for the duration of a request, or raise :class:`Rejected`."""
+        if not self.enabled:
+            yield
+            return
+        policy = self.policies[route]
+        try:
+            self.rate_limiter.check((user_id, route), policy)
+        except Rejected:
+            self.throttled += 1
+            raise
+        async with self.groups[policy.group].slot():
+            yield
+
+    def snapshot(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'throttled': self.throttled,
+            'groups': {name: group.snapshot() for name, group in self.groups.items()},
+        }
@@ -0,0 +1,134 @@
+"""Streaming anomaly detection on incoming production records.
+
+Every record written through the production endpoints is scored against
+running statistics of its machine before being folded into them, in O(1) per
+metric. Two estimators are kept per (machine, metric):
+
+* Welford's algorithm for the long-run mean and variance;
+* an exponentially weighted mean and variance (EWMA), which tracks drift and
+  is the baseline records are scored against.
+
+A record whose value deviates from the EWMA baseline by more than
+``z_threshold`` standard deviations, in the harmful direction (low output,
+efficiency or OEE, high downtime), produces an alert document.
+"""
+import math
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Metric -> direction in which a deviation is harmful
+METRICS = {
+    'output': 'low',
+    'downtime': 'high',
+    'efficiency': 'low',
+    'oee': 'low',
+}
+
+
+class RunningStats:
+    """Welford mean/variance plus exponentially weighted mean/variance of one series."""
+
+    __slots__ = ('count', 'mean', 'm2', 'ewma', 'ewmvar')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = 0.0
+        self.ewmvar = 0.0
+
+    def update(self, value: float, alpha: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        if self.count == 1:
+            self.ewma = value
+            return
+        diff = value - self.ewma
+        increment = alpha * diff
+        self.ewma += increment
+        self.ewmvar = (1 - alpha) * (self.ewmvar + diff * increment)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def z_score(self, value: float) -> Optional[float]:
+        """Deviation of ``value`` from the EWMA baseline, in EW standard deviations."""
+        # Never trust a spread tighter than 10% of the long-run one (flat stretches)
+        spread = max(self.ewmvar, 0.01 * self.variance)
+        if spread <= 0:
+            return None
+        return (value - self.ewma) / math.sqrt(spread)
+
+
+class AnomalyDetector:
+    """Per-machine running statistics and alerting for production metrics."""
+
+    def __init__(self, z_threshold: float = 3.0, min_samples: int = 10, alpha: float = 0.1):
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self._stats: Dict[Tuple[str, str], RunningStats] = {}
+
+    def stats(self, machine_id: str, metric: str) -> Optional[RunningStats]:
+        return self._stats.get((machine_id, metric))
+
+    def observe(self, record: dict, alert: bool = True) -> List[dict]:
+        """Score a record, fold it into the statistics and return any alerts it raises."""
+        alerts = []
+        machine_id = str(record['machine_id'])
+        for metric, direction in METRICS.items():
+            value = record.get(metric)
+            if value is None:
+                continue
+            value = float(value)
+            key = (machine_id, metric)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RunningStats()
+
+            if alert and stats.count >= self.min_samples:
+                z_score = stats.z_score(value)
+                harmful = z_score is not None and (z_score <= -self.z_threshold if direction == 'low'
+                                                   else z_score >= self.z_threshold)
+                if harmful:
+                    alerts.append(self._alert(record, metric, value, stats, z_score))
+            stats.update(value, self.alpha)
+        return alerts
+
+    def observe_many(self, records: Iterable[dict], alert: bool = True) -> List[dict]:
+        alerts = []
+        for record in records:
+            alerts.extend(self.observe(record, alert))
+        return alerts
+
+    def seed(self, machine_id: str, series: Dict[str, Iterable[float]]):
+        """Warm a machine's statistics from its history (oldest first) without alerting."""
+        for metric in METRICS:
+            values = series.get(metric)
+            if values is None:
+                continue
+            stats = self._stats.setdefault((machine_id, metric), RunningStats())
+            for value in values:
+                stats.update(float(value), self.alpha)
+
+    def _alert(self, record: dict, metric: str, value: float, stats: RunningStats, z_score: float) -> dict:
+        severity = 'critical' if abs(z_score) >= 2 * self.z_threshold else 'warning'
+        return {
+            'id': str(uuid.uuid4()),
+            'machine_id': str(record['machine_id']),
+            'production_id': record.get('id'),
+            'date': record.get('date'),
+            'metric': metric,
+            'value': round(value, 2),
+            'expected': round(stats.ewma, 2),
+            'std': round(math.sqrt(max(stats.ewmvar, 0.0)), 2),
+            'z_score': round(z_score, 2),
+            'severity': severity,
+            'acknowledged': False,
+            'created_at': datetime.now(timezone.utc),
+        }
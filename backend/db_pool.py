@@ -0,0 +1,227 @@
+"""MongoDB client configuration and connection pool metrics.
+
+The API uses two Motor clients: the default one serves authentication and
+ingestion writes, and a separate analytics client serves heavy reads (trends,
+model training) with its own connection pool and a secondary-preferring read
+preference. Analytic load then cannot exhaust the pool that writes depend on.
+
+Settings are read from the environment. ``MONGO_<SETTING>`` applies to both
+clients and ``MONGO_ANALYTICS_<SETTING>`` overrides it for the analytics client:
+
+    MAX_POOL_SIZE, MIN_POOL_SIZE, MAX_CONNECTING, MAX_IDLE_TIME_MS,
+    WAIT_QUEUE_TIMEOUT_MS, CONNECT_TIMEOUT_MS, SERVER_SELECTION_TIMEOUT_MS,
+    SOCKET_TIMEOUT_MS
+
+``MONGO_COMPRESSORS`` (default ``zstd,snappy``) lists wire compressors in order
+of preference. Compressors whose Python package is missing are skipped.
+``MONGO_ANALYTICS_READ_PREFERENCE`` (default ``secondaryPreferred``) and
+``MONGO_ANALYTICS_MAX_STALENESS_SECONDS`` control analytics read routing.
+"""
+import importlib.util
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+logger = logging.getLogger(__name__)
+
+POOL_SETTINGS = (
+    ('maxPoolSize', 'MAX_POOL_SIZE'),
+    ('minPoolSize', 'MIN_POOL_SIZE'),
+    ('maxConnecting', 'MAX_CONNECTING'),
+    ('maxIdleTimeMS', 'MAX_IDLE_TIME_MS'),
+    ('waitQueueTimeoutMS', 'WAIT_QUEUE_TIMEOUT_MS'),
+    ('connectTimeoutMS', 'CONNECT_TIMEOUT_MS'),
+    ('serverSelectionTimeoutMS', 'SERVER_SELECTION_TIMEOUT_MS'),
+    ('socketTimeoutMS', 'SOCKET_TIMEOUT_MS'),
+)
+
+# Defaults applied when neither MONGO_<SETTING> nor MONGO_ANALYTICS_<SETTING> is set
+ROLE_DEFAULTS = {
+    'default': {'maxPoolSize': 100, 'waitQueueTimeoutMS': 5000},
+    'analytics': {'maxPoolSize': 20, 'waitQueueTimeoutMS': 30000},
+}
+
+# Python package each wire compressor depends on
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def available_compressors(requested: str) -> List[str]:
+    """Filter a comma separated compressor list down to those installed here."""
+    compressors = []
+    for name in (part.strip() for part in requested.split(',')):
+        if not name:
+            continue
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            logger.warning("Unknown MongoDB compressor %r ignored", name)
+        elif importlib.util.find_spec(module) is None:
+            logger.info("MongoDB compressor %r unavailable (missing %s package)", name, module)
+        else:
+            compressors.append(name)
+    return compressors
+
+
+def client_options(role: str = 'default') -> Dict[str, object]:
+    """Keyword arguments for ``AsyncIOMotorClient`` for the ``default`` or ``analytics`` role."""
+    options: Dict[str, object] = dict(ROLE_DEFAULTS[role])
+    for option, suffix in POOL_SETTINGS:
+        value = os.environ.get(f'MONGO_{suffix}')
+        if role == 'analytics':
+            value = os.environ.get(f'MONGO_ANALYTICS_{suffix}', value)
+        if value:
+            options[option] = int(value)
+
+    compressors = available_compressors(os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy'))
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+        if 'zlib' in compressors and os.environ.get('MONGO_ZLIB_COMPRESSION_LEVEL'):
+            options['zlibCompressionLevel'] = int(os.environ['MONGO_ZLIB_COMPRESSION_LEVEL'])
+    return options
+
+
+def analytics_read_preference():
+    """Read preference for analytics and training queries."""
+    mode = os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Invalid MONGO_ANALYTICS_READ_PREFERENCE: {mode}")
+    if mode == 'primary':
+        return Primary()
+    max_staleness = int(os.environ.get('MONGO_ANALYTICS_MAX_STALENESS_SECONDS', '-1'))
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+class _ServerPoolStats:
+    __slots__ = (
+        'max_pool_size', 'open', 'in_use', 'waiting', 'peak_in_use', 'peak_waiting',
+        'checkouts', 'checkout_failures', 'total_wait', 'max_wait', 'clears',
+    )
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.peak_waiting = 0
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.clears = 0
+
+    def snapshot(self) -> dict:
+        return {
+            'max_pool_size': self.max_pool_size,
+            'open_connections': self.open,
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'saturation': round(self.in_use / self.max_pool_size, 3) if self.max_pool_size else 0.0,
+            'peak_in_use': self.peak_in_use,
+            'peak_waiting': self.peak_waiting,
+            'checkouts': self.checkouts,
+            'checkout_failures': dict(self.checkout_failures),
+            'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'pool_clears': self.clears,
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool listener tracking saturation and checkout wait per server.
+
+    PyMongo calls listeners from the threads Motor runs its operations on, so the
+    counters are guarded by a lock and check-out start times are thread-local.
+    """
+
+    def __init__(self, default_max_pool_size: int = 100):
+        self._default_max_pool_size = default_max_pool_size
+        self._servers: Dict[str, _ServerPoolStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stats(self, address, max_pool_size: Optional[int] = None) -> _ServerPoolStats:
+        key = '%s:%s' % address
+        stats = self._servers.get(key)
+        if stats is None:
+            stats = self._servers[key] = _ServerPoolStats(max_pool_size or self._default_max_pool_size)
+        return stats
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {address: stats.snapshot() for address, stats in self._servers.items()}
+
+    def pool_created(self, event):
+        with self._lock:
+            self._stats(event.address, event.options.get('maxPoolSize'))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats(event.address).clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop('%s:%s' % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.open = max(0, stats.open - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting += 1
+            stats.peak_waiting = max(stats.peak_waiting, stats.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting = max(0, stats.waiting - 1)
+            stats.checkout_failures[event.reason] = stats.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting = max(0, stats.waiting - 1)
+            stats.in_use += 1
+            stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+            stats.checkouts += 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.in_use = max(0, stats.in_use - 1)
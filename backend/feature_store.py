@@ -0,0 +1,381 @@
+"""Feature store for the ML models: per-machine rolling-window features.
+
+Features for a target day are computed only from history strictly before it.
+The anchor is the day after the machine's last observation before the target:
+
+* 7/14/30-day means of output, downtime, efficiency and OEE ending at the anchor
+* the last observed value of each metric (lag 1)
+* 14-day least-squares trends (per day) of efficiency and OEE
+* days since the machine's last maintenance before the anchor
+* the horizon (days between the last observation and the target) and the
+  target's day of week and month
+
+Training rows (one per production record) are materialised into
+``production_features`` as records arrive, and the latest per-machine snapshot
+(the features for the day after the last observation) into ``machine_features``.
+Records appended after a machine's latest data are computed from the hot store;
+backfills (records dated before stored ones, or older than the hot window) make
+the machine's rows be recomputed from its full history in MongoDB.
+Training and inference therefore read the same precomputed features, built by
+the single :func:`compute_features` implementation.
+"""
+import bisect
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from hot_store import date_to_day, day_to_date
+
+logger = logging.getLogger(__name__)
+
+FEATURE_SET = "rolling-v1"
+BASE_METRICS = ('output', 'downtime', 'efficiency', 'oee')
+WINDOWS = (7, 14, 30)
+TREND_METRICS = ('efficiency', 'oee')
+TREND_WINDOW = 14
+MAX_DAYS_SINCE_MAINTENANCE = 365
+TARGETS = ('efficiency', 'oee')
+
+CALENDAR_FEATURES = ('horizon_days', 'day_of_week', 'month')
+FEATURE_COLUMNS = tuple(
+    [f'{metric}_mean_{window}d' for metric in BASE_METRICS for window in WINDOWS]
+    + [f'{metric}_lag_1' for metric in BASE_METRICS]
+    + [f'{metric}_trend_{TREND_WINDOW}d' for metric in TREND_METRICS]
+    + ['days_since_maintenance']
+    + list(CALENDAR_FEATURES)
+)
+
+# Models trained before the feature store used same-day output/downtime; at inference
+# time those are approximated by the 7-day means, as the old 5-record average was.
+LEGACY_FEATURE_ALIASES = {'output': 'output_mean_7d', 'downtime': 'downtime_mean_7d'}
+
+
+def _day_of_week(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday (weekday 3)
+    return (days + 3) % 7
+
+
+def _month(days: np.ndarray) -> np.ndarray:
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+def feature_watermark(snapshot: dict) -> str:
+    """Digest of a snapshot's inputs; changes exactly when new data changes the features.
+
+    Values are rounded so that a snapshot recomputed from the hot store and one
+    rebuilt from the full history (different float summation) agree.
+    """
+    values = [snapshot['last_observed_date']]
+    values.extend(round(float(snapshot[name]), 6) for name in FEATURE_COLUMNS if name not in CALENDAR_FEATURES)
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
+
+
+def compute_features(
+    days: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    targets: np.ndarray,
+    maintenance_days: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Feature columns for ``targets`` (day numbers) from a machine's history.
+
+    ``days`` must be sorted ascending with ``columns`` aligned to it. Returns a
+    mask of the targets that have any history before them, and the features of
+    those targets.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    end = np.searchsorted(days, targets, side='left')
+    valid = end > 0
+    end, targets = end[valid], targets[valid]
+    if not len(targets):
+        return valid, {name: np.empty(0) for name in FEATURE_COLUMNS}
+
+    last = days[end - 1]
+    anchor = last + 1
+    features: Dict[str, np.ndarray] = {}
+
+    for metric in BASE_METRICS:
+        values = np.asarray(columns[metric], dtype=np.float64)
+        cumulative = np.concatenate(([0.0], np.cumsum(values)))
+        for window in WINDOWS:
+            start = np.searchsorted(days, anchor - window, side='left')
+            features[f'{metric}_mean_{window}d'] = (cumulative[end] - cumulative[start]) / (end - start)
+        features[f'{metric}_lag_1'] = values[end - 1]
+
+    x = (days - days[0]).astype(np.float64)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_xx = np.concatenate(([0.0], np.cumsum(x * x)))
+    start = np.searchsorted(days, anchor - TREND_WINDOW, side='left')
+    n = (end - start).astype(np.float64)
+    sum_x = cum_x[end] - cum_x[start]
+    denominator = n * (cum_xx[end] - cum_xx[start]) - sum_x * sum_x
+    for metric in TREND_METRICS:
+        values = np.asarray(columns[metric], dtype=np.float64)
+        cum_y = np.concatenate(([0.0], np.cumsum(values)))
+        cum_xy = np.concatenate(([0.0], np.cumsum(x * values)))
+        sum_y = cum_y[end] - cum_y[start]
+        numerator = n * (cum_xy[end] - cum_xy[start]) - sum_x * sum_y
+        features[f'{metric}_trend_{TREND_WINDOW}d'] = np.divide(
+            numerator, denominator, out=np.zeros_like(numerator), where=denominator > 1e-9
+        )
+
+    since = np.full(len(targets), MAX_DAYS_SINCE_MAINTENANCE, dtype=np.float64)
+    if maintenance_days is not None and len(maintenance_days):
+        index = np.searchsorted(maintenance_days, anchor, side='left')
+        has_previous = index > 0
+        previous = np.asarray(maintenance_days)[np.maximum(index - 1, 0)]
+        since = np.where(has_previous, np.minimum(anchor - previous, MAX_DAYS_SINCE_MAINTENANCE), since)
+    features['days_since_maintenance'] = since
+
+    features['horizon_days'] = (targets - last).astype(np.float64)
+    features['day_of_week'] = _day_of_week(targets).astype(np.float64)
+    features['month'] = _month(targets).astype(np.float64)
+    return valid, features
+
+
+class FeatureStore:
+    """Materialises training rows and per-machine snapshots as data arrives."""
+
+    def __init__(self, hot_store, sync_overlap_seconds: float = 60.0):
+        self.hot_store = hot_store
+        self.sync_overlap = timedelta(seconds=sync_overlap_seconds)
+        self._maintenance: Dict[str, List[int]] = {}
+        self._snapshots: Dict[str, dict] = {}
+        # Maintenance log ids tracked, and the newest created_at read from MongoDB
+        self._maintenance_ids: set = set()
+        self._maintenance_watermark: Optional[datetime] = None
+
+    @staticmethod
+    def _maintenance_projection() -> dict:
+        return {'_id': 0, 'id': 1, 'machine_id': 1, 'date': 1, 'created_at': 1}
+
+    def _track_maintenance(self, log: dict) -> bool:
+        """Add a log's day to its machine's maintenance days, once per log id."""
+        if log.get('id') is not None:
+            if log['id'] in self._maintenance_ids:
+                return False
+            self._maintenance_ids.add(log['id'])
+        day = date_to_day(log.get('date'))
+        if day is None:
+            return False
+        bisect.insort(self._maintenance.setdefault(log['machine_id'], []), day)
+        return True
+
+    def _advance_watermark(self, log: dict):
+        created_at = log.get('created_at')
+        if isinstance(created_at, datetime) and (
+                self._maintenance_watermark is None or created_at > self._maintenance_watermark):
+            self._maintenance_watermark = created_at
+
+    async def load_maintenance(self, collection):
+        self._maintenance, self._maintenance_ids, self._maintenance_watermark = {}, set(), None
+        async for log in collection.find({}, self._maintenance_projection()):
+            self._track_maintenance(log)
+            self._advance_watermark(log)
+
+    async def sync_maintenance(self, collection) -> List[str]:
+        """Pick up maintenance logs other workers recorded; returns the machines affected.
+
+        Every worker must see the same maintenance days, or they compute different
+        ``days_since_maintenance`` and hence different features and watermarks. Like
+        :meth:`HotProductionStore.sync`, re-reads an overlap window below the newest
+        ``created_at`` seen and skips logs already tracked.
+        """
+        query = {}
+        if self._maintenance_watermark is not None:
+            query['created_at'] = {'$gt': self._maintenance_watermark - self.sync_overlap}
+        machine_ids = set()
+        async for log in collection.find(query, self._maintenance_projection()):
+            if self._track_maintenance(log):
+                machine_ids.add(log['machine_id'])
+            self._advance_watermark(log)
+        self.refresh_snapshots(machine_ids)
+        return sorted(machine_ids)
+
+    async def record_maintenance(self, db, log: dict):
+        """Track a new maintenance log and refresh the machine's snapshot."""
+        if self._track_maintenance(log):
+            await self._write(db, [], self.refresh_snapshots([log['machine_id']]))
+
+    def _maintenance_days(self, machine_id: str) -> np.ndarray:
+        return np.asarray(self._maintenance.get(machine_id, ()), dtype=np.int64)
+
+    def _snapshot_from(self, machine_id: str, series: Dict[str, np.ndarray]) -> dict:
+        days = series['day']
+        _, features = compute_features(days, series, [int(days[-1]) + 1], self._maintenance_days(machine_id))
+        snapshot = {name: float(values[0]) for name, values in features.items()}
+        snapshot.update({
+            'machine_id': machine_id,
+            'feature_set': FEATURE_SET,
+            'last_observed_date': day_to_date(days[-1]),
+            'updated_at': datetime.now(timezone.utc),
+        })
+        snapshot['watermark'] = feature_watermark(snapshot)
+        return snapshot
+
+    def refresh_snapshots(self, machine_ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """Recompute in-memory snapshots from the hot store (all hot machines by default)."""
+        refreshed = []
+        for machine_id in (self.hot_store.machine_ids() if machine_ids is None else machine_ids):
+            series = self.hot_store.series(machine_id)
+            if series is not None:
+                self._snapshots[machine_id] = self._snapshot_from(machine_id, series)
+                refreshed.append(self._snapshots[machine_id])
+        return refreshed
+
+    def _training_rows(self, machine_id: str, series: Dict[str, np.ndarray], records: List[dict]) -> List[dict]:
+        targets = [date_to_day(record.get('date')) for record in records]
+        keep = [i for i, day in enumerate(targets) if day is not None]
+        if not keep:
+            return []
+        valid, features = compute_features(
+            series['day'], series, [targets[i] for i in keep], self._maintenance_days(machine_id)
+        )
+        kept = [records[i] for i, is_valid in zip(keep, valid) if is_valid]
+        updated_at = datetime.now(timezone.utc)
+        rows = []
+        for row_index, record in enumerate(kept):
+            row = {name: float(values[row_index]) for name, values in features.items()}
+            row.update({
+                'production_id': record['id'],
+                'machine_id': machine_id,
+                'date': record['date'],
+                'feature_set': FEATURE_SET,
+                'updated_at': updated_at,
+            })
+            for target in TARGETS:
+                row[target] = float(record[target])
+            rows.append(row)
+        return rows
+
+    def _appends(self, series: Optional[Dict[str, np.ndarray]], records: List[dict]) -> bool:
+        """Whether the hot store alone yields the features of ``records`` and no other row changes.
+
+        True when no stored record is dated after the earliest new one, and the history
+        the earliest one needs (30 days before its previous observation) is in the window.
+        """
+        days = [day for day in (date_to_day(record.get('date')) for record in records) if day is not None]
+        if series is None or not days:
+            return False
+        earliest = min(days)
+        hot_days = series['day']
+        later = int(np.count_nonzero(hot_days > earliest))
+        if later > sum(1 for day in days if day > earliest):
+            return False
+        previous = hot_days[hot_days < earliest]
+        return len(previous) > 0 and int(previous.max()) - max(WINDOWS) >= self.hot_store.first_day()
+
+    async def materialize(self, db, records: List[dict]):
+        """Compute and store training rows and snapshots for newly inserted records.
+
+        History comes from the hot store, which already holds ``records``. A machine
+        whose new records are not simply appended to its history is recomputed from
+        ``db.production_data`` (see :meth:`_appends`).
+        """
+        by_machine: Dict[str, List[dict]] = {}
+        for record in records:
+            by_machine.setdefault(str(record['machine_id']), []).append(record)
+
+        rows, snapshots, backfilled = [], [], []
+        for machine_id, machine_records in by_machine.items():
+            series = self.hot_store.series(machine_id)
+            if not self._appends(series, machine_records):
+                backfilled.append(machine_id)
+                continue
+            rows.extend(self._training_rows(machine_id, series, machine_records))
+            snapshots.extend(self.refresh_snapshots([machine_id]))
+        await self._write(db, rows, snapshots)
+        for machine_id in backfilled:
+            await self.rebuild_machine(db, db, machine_id)
+
+    async def _write(self, db, rows: List[dict], snapshots: List[dict]):
+        for start in range(0, len(rows), 1000):
+            await db.production_features.bulk_write([
+                ReplaceOne({'production_id': row['production_id']}, row, upsert=True)
+                for row in rows[start:start + 1000]
+            ], ordered=False)
+        if snapshots:
+            await db.machine_features.bulk_write([
+                ReplaceOne({'machine_id': snapshot['machine_id']}, snapshot, upsert=True)
+                for snapshot in snapshots
+            ], ordered=False)
+
+    @staticmethod
+    def _history_projection() -> dict:
+        projection = {'_id': 0, 'id': 1, 'machine_id': 1, 'date': 1}
+        projection.update({metric: 1 for metric in BASE_METRICS})
+        return projection
+
+    async def rebuild(self, source_db, db) -> int:
+        """Recompute every training row and snapshot from ``production_data``. Returns the row count."""
+        await self.load_maintenance(source_db.maintenance_logs)
+
+        total = 0
+        machine_id, pending = None, []
+        cursor = source_db.production_data.find({}, self._history_projection()).sort([('machine_id', 1), ('date', 1)])
+        async for doc in cursor:
+            if doc['machine_id'] != machine_id and pending:
+                total += await self._rebuild_machine(db, machine_id, pending)
+                pending = []
+            machine_id = doc['machine_id']
+            pending.append(doc)
+        if pending:
+            total += await self._rebuild_machine(db, machine_id, pending)
+        return total
+
+    async def rebuild_machine(self, source_db, db, machine_id: str) -> int:
+        """Recompute one machine's training rows and snapshot from its full history."""
+        docs = await source_db.production_data.find(
+            {'machine_id': machine_id}, self._history_projection()
+        ).sort('date', 1).to_list(None)
+        return await self._rebuild_machine(db, machine_id, docs)
+
+    async def _rebuild_machine(self, db, machine_id: str, docs: List[dict]) -> int:
+        docs = [doc for doc in docs if date_to_day(doc.get('date')) is not None]
+        if not docs:
+            return 0
+        series = {metric: np.array([float(doc.get(metric) or 0.0) for doc in docs]) for metric in BASE_METRICS}
+        series['day'] = np.array([date_to_day(doc['date']) for doc in docs], dtype=np.int64)
+        rows = self._training_rows(machine_id, series, docs)
+        snapshot = self._snapshot_from(machine_id, series)
+        if machine_id not in self._snapshots or \
+                self._snapshots[machine_id]['last_observed_date'] <= snapshot['last_observed_date']:
+            self._snapshots[machine_id] = snapshot
+        await self._write(db, rows, [snapshot])
+        return len(rows)
+
+    async def snapshot(self, db, machine_id: str) -> Optional[dict]:
+        """Latest precomputed features of a machine (memory first, then ``machine_features``)."""
+        snapshot = self._snapshots.get(machine_id)
+        if snapshot is None:
+            snapshot = await db.machine_features.find_one({'machine_id': machine_id}, {'_id': 0})
+            if snapshot is not None:
+                snapshot.setdefault('watermark', feature_watermark(snapshot))
+                self._snapshots[machine_id] = snapshot
+        return snapshot
+
+    @staticmethod
+    def inference_rows(snapshot: dict, target_dates: List[str]) -> List[dict]:
+        """Feature rows for future dates: the snapshot with calendar features per target."""
+        last = date_to_day(snapshot['last_observed_date'])
+        targets = np.array([date_to_day(target) for target in target_dates], dtype=np.int64)
+        day_of_week, month = _day_of_week(targets), _month(targets)
+        rows = []
+        for i, target in enumerate(targets):
+            row = dict(snapshot)
+            row['horizon_days'] = float(target - last)
+            row['day_of_week'] = float(day_of_week[i])
+            row['month'] = float(month[i])
+            for legacy, feature in LEGACY_FEATURE_ALIASES.items():
+                row[legacy] = row[feature]
+            rows.append(row)
+        return rows
+
+
+def feature_matrix(rows: List[dict], columns: Iterable[str]) -> np.ndarray:
+    columns = list(columns)
+    return np.array([[row[column] for column in columns] for row in rows], dtype=np.float64).reshape(-1, len(columns))
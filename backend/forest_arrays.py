@@ -0,0 +1,88 @@
+"""Random forests stored as flat NumPy arrays and served from memory maps.
+
+Unpickling a scikit-learn forest copies every tree's node arrays into the
+process (``Tree.__setstate__`` does not keep ``np.memmap`` views), so each API
+worker would hold a private copy of every model. Instead, the registry exports
+a fitted forest as five ``.npy`` files (all trees concatenated) and workers
+open them with ``mmap_mode='r'``: the pages are shared through the page cache
+and only the nodes touched by a prediction are read.
+
+:class:`MappedForest` reproduces ``RandomForestRegressor.predict`` for
+single-output regression forests; it only needs NumPy.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+ARRAYS = ('children_left', 'children_right', 'feature', 'threshold', 'value')
+LEAF = -1
+
+
+def is_exportable(model) -> bool:
+    """Single-output forest (or single tree ensemble) of regression trees."""
+    estimators = getattr(model, 'estimators_', None)
+    return (
+        bool(estimators)
+        and all(hasattr(tree, 'tree_') for tree in estimators)
+        and getattr(model, 'n_outputs_', 1) == 1
+        and not hasattr(model, 'classes_')
+    )
+
+
+def export_forest(model, directory: Path):
+    """Write the trees of a fitted forest as concatenated node arrays."""
+    directory = Path(directory)
+    directory.mkdir(parents=True)
+    parts = {name: [] for name in ARRAYS}
+    roots, offset, max_depth = [], 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        leaf = left == LEAF
+        parts['children_left'].append(np.where(leaf, LEAF, left + offset))
+        parts['children_right'].append(np.where(leaf, LEAF, right + offset))
+        # Leaves read column 0 during the vectorised walk; their result is discarded
+        parts['feature'].append(np.where(leaf, 0, tree.feature).astype(np.int64))
+        parts['threshold'].append(tree.threshold.astype(np.float64))
+        parts['value'].append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    for name, arrays in parts.items():
+        np.save(directory / f'{name}.npy', np.concatenate(arrays))
+    np.save(directory / 'roots.npy', np.asarray(roots, dtype=np.int64))
+    (directory / 'forest.json').write_text(json.dumps({
+        'n_estimators': len(roots),
+        'n_features_in': int(getattr(model, 'n_features_in_', 0)),
+        'max_depth': int(max_depth),
+    }))
+
+
+class MappedForest:
+    """Read-only forest whose node arrays are memory-mapped ``.npy`` files."""
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        info = json.loads((directory / 'forest.json').read_text())
+        self.n_features_in_ = info['n_features_in']
+        self.max_depth = info['max_depth']
+        for name in ARRAYS + ('roots',):
+            setattr(self, name, np.load(directory / f'{name}.npy', mmap_mode='r'))
+
+    def predict(self, X) -> np.ndarray:
+        """Mean of the trees' leaf values, walking every (row, tree) pair level by level."""
+        # scikit-learn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.repeat(np.asarray(self.roots)[None, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            internal = left != LEAF
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return self.value[nodes].mean(axis=1)
@@ -0,0 +1,349 @@
+"""In-memory columnar store for recent production data.
+
+The dashboard, trends and prediction endpoints only ever look at the last
+few weeks of ``production_data``. Instead of re-querying MongoDB and building
+a DataFrame from a list of dicts on every call, the API keeps the last
+``window_days`` days as NumPy columns per machine and answers those requests
+with vectorised reductions.
+
+The store is loaded once at startup and kept up to date by the write
+endpoints through :meth:`HotProductionStore.add`. When several workers serve
+the API, each one also tails records written by the others with
+:meth:`HotProductionStore.sync`.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = (
+    'output',
+    'downtime',
+    'efficiency',
+    'oee',
+    'quality_rate',
+    'availability',
+    'performance',
+)
+
+# Values used when an older document is missing a column (mirrors ProductionData defaults)
+COLUMN_DEFAULTS = {
+    'oee': 0.0,
+    'quality_rate': 1.0,
+    'availability': 1.0,
+    'performance': 1.0,
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def date_to_day(value) -> Optional[int]:
+    """Convert a ``YYYY-MM-DD`` string to a day number (days since 1970-01-01)."""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal() - _EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """MongoDB returns naive UTC datetimes; normalise aware ones to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def day_to_date(day: int) -> str:
+    """Convert a day number back to a ``YYYY-MM-DD`` string."""
+    return date.fromordinal(int(day) + _EPOCH_ORDINAL).isoformat()
+
+
+class _MachineColumns:
+    """Growable column arrays holding the hot rows of a single machine."""
+
+    __slots__ = ('size', 'days', 'columns', 'modified')
+
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.modified: Optional[datetime] = None  # when rows last became visible in the store
+        self.days = np.empty(capacity, dtype=np.int32)
+        self.columns = {name: np.empty(capacity, dtype=np.float64) for name in METRIC_COLUMNS}
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self.days)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        days = np.empty(capacity, dtype=np.int32)
+        days[:self.size] = self.days[:self.size]
+        self.days = days
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def extend(self, days: List[int], values: Dict[str, List[float]]):
+        count = len(days)
+        self._reserve(count)
+        end = self.size + count
+        self.days[self.size:end] = days
+        for name in METRIC_COLUMNS:
+            self.columns[name][self.size:end] = values[name]
+        self.size = end
+
+    def prune(self, min_day: int):
+        """Drop rows older than ``min_day``, compacting in place."""
+        keep = self.days[:self.size] >= min_day
+        kept = int(keep.sum())
+        if kept == self.size:
+            return
+        self.days[:kept] = self.days[:self.size][keep]
+        for column in self.columns.values():
+            column[:kept] = column[:self.size][keep]
+        self.size = kept
+
+    def view(self):
+        return self.days[:self.size], {name: column[:self.size] for name, column in self.columns.items()}
+
+
+class HotProductionStore:
+    """Array-backed copy of the last ``window_days`` days of production data."""
+
+    def __init__(self, window_days: int = 90, sync_overlap_seconds: float = 60.0):
+        self.window_days = window_days
+        self.sync_overlap = timedelta(seconds=sync_overlap_seconds)
+        self.loaded = False
+        self._machines: Dict[str, _MachineColumns] = {}
+        self._pruned_on: Optional[int] = None
+        # Newest created_at seen, and ids seen near it, for tailing other workers' writes
+        self._watermark: Optional[datetime] = None
+        self._recent_ids: Dict[str, datetime] = {}
+        self._last_stamp: Optional[datetime] = None
+
+    def _stamp(self) -> datetime:
+        """Naive UTC now at millisecond precision, later than every earlier stamp."""
+        now = _utc_naive(datetime.now(timezone.utc))
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        if self._last_stamp is not None and now <= self._last_stamp:
+            now = self._last_stamp + timedelta(milliseconds=1)
+        self._last_stamp = now
+        return now
+
+    @staticmethod
+    def _today() -> int:
+        return date.today().toordinal() - _EPOCH_ORDINAL
+
+    def first_day(self) -> int:
+        """Day number of the oldest day the hot window holds."""
+        return self._today() - self.window_days
+
+    def covers(self, days: int) -> bool:
+        """Whether a query over the last ``days`` days can be answered from memory."""
+        return self.loaded and days <= self.window_days
+
+    async def load(self, collection, batch_size: int = 5000):
+        """(Re)load the hot window from a ``production_data`` collection."""
+        cutoff = (date.today() - timedelta(days=self.window_days)).isoformat()
+        cursor = collection.find({'date': {'$gte': cutoff}}, self._projection()).batch_size(batch_size)
+        self._machines = {}
+        self._pruned_on = self._today()
+        self._watermark = None
+        self._recent_ids = {}
+        loaded = 0
+        pending = []
+        async for doc in cursor:
+            pending.append(doc)
+            if len(pending) >= batch_size:
+                loaded += self.add(pending)
+                pending = []
+        loaded += self.add(pending)
+        self._trim_recent_ids()
+
+        self.loaded = True
+        logger.info("Hot store loaded %d production records for %d machines", loaded, len(self._machines))
+
+    @staticmethod
+    def _projection() -> dict:
+        projection = {'_id': 0, 'id': 1, 'machine_id': 1, 'date': 1, 'created_at': 1}
+        projection.update({name: 1 for name in METRIC_COLUMNS})
+        return projection
+
+    async def sync(self, collection) -> List[dict]:
+        """Pull records other workers inserted since the last sync and return them.
+
+        Re-reads a ``sync_overlap_seconds`` window below the newest ``created_at`` seen,
+        as a batch insert can commit after a later-stamped one from another worker;
+        ids already seen in that window are skipped.
+        """
+        if not self.loaded:
+            return []
+        query = {}
+        if self._watermark is not None:
+            query['created_at'] = {'$gt': self._watermark - self.sync_overlap}
+        fresh = [
+            doc async for doc in collection.find(query, self._projection())
+            if doc.get('id') not in self._recent_ids
+        ]
+        self.add(fresh)
+        self._trim_recent_ids()
+        return fresh
+
+    def _trim_recent_ids(self):
+        if self._watermark is None:
+            return
+        horizon = self._watermark - self.sync_overlap
+        self._recent_ids = {
+            record_id: created_at for record_id, created_at in self._recent_ids.items()
+            if created_at > horizon
+        }
+
+    def _track(self, record: dict):
+        created_at = record.get('created_at')
+        if not isinstance(created_at, datetime):
+            return
+        created_at = _utc_naive(created_at)
+        if record.get('id'):
+            self._recent_ids[record['id']] = created_at
+        if self._watermark is None or created_at > self._watermark:
+            self._watermark = created_at
+
+    def add(self, records: Iterable[dict]) -> int:
+        """Append freshly written production records. Returns how many were kept."""
+        self._maybe_prune()
+        min_day = self._today() - self.window_days
+        grouped: Dict[str, tuple] = {}
+        kept = 0
+        for record in records:
+            self._track(record)
+            day = date_to_day(record.get('date'))
+            if day is None or day < min_day:
+                continue
+            machine_id = str(record['machine_id'])
+            if machine_id not in grouped:
+                grouped[machine_id] = ([], {name: [] for name in METRIC_COLUMNS})
+            days, values = grouped[machine_id]
+            days.append(day)
+            for name in METRIC_COLUMNS:
+                value = record.get(name)
+                values[name].append(float(COLUMN_DEFAULTS.get(name, 0.0) if value is None else value))
+            kept += 1
+
+        # Dated when the rows became visible here, not by created_at: rows can arrive out of
+        # created_at order (concurrent inserts, other workers' rows pulled in by sync)
+        stamp = self._stamp() if grouped else None
+        for machine_id, (days, values) in grouped.items():
+            columns = self._machines.get(machine_id)
+            if columns is None:
+                columns = self._machines[machine_id] = _MachineColumns(max(64, len(days)))
+            columns.extend(days, values)
+            columns.modified = stamp
+
+        if len(self._recent_ids) > 10000:
+            self._trim_recent_ids()
+        return kept
+
+    def _maybe_prune(self):
+        today = self._today()
+        if self._pruned_on == today:
+            return
+        min_day = today - self.window_days
+        for columns in self._machines.values():
+            columns.prune(min_day)
+        self._pruned_on = today
+
+    def _select(self, start_date: str, machine_id: Optional[str] = None):
+        """Yield ``(machine_id, days, columns)`` for rows dated on or after ``start_date``."""
+        start_day = date_to_day(start_date)
+        if machine_id is not None:
+            items = [(machine_id, self._machines[machine_id])] if machine_id in self._machines else []
+        else:
+            items = self._machines.items()
+        for key, machine in items:
+            if machine.size == 0:
+                continue
+            days, columns = machine.view()
+            mask = days >= start_day
+            if mask.all():
+                yield key, days, columns
+            elif mask.any():
+                yield key, days[mask], {name: column[mask] for name, column in columns.items()}
+
+    def summary(self, start_date: str) -> dict:
+        """Fleet-wide KPI reductions over rows dated on or after ``start_date``."""
+        records = 0
+        oee_sum = downtime_sum = efficiency_sum = output_sum = 0.0
+        for _, days, columns in self._select(start_date):
+            records += len(days)
+            oee_sum += float(columns['oee'].sum())
+            downtime_sum += float(columns['downtime'].sum())
+            efficiency_sum += float(columns['efficiency'].sum())
+            output_sum += float(columns['output'].sum())
+
+        if not records:
+            return {'records': 0}
+        return {
+            'records': records,
+            'average_oee': oee_sum / records,
+            'total_downtime': downtime_sum,
+            'average_efficiency': efficiency_sum / records,
+            'production_output': output_sum,
+        }
+
+    def daily_trends(self, start_date: str, machine_id: Optional[str] = None) -> dict:
+        """Per-day mean OEE/efficiency and summed output/downtime, sorted by date."""
+        selected = list(self._select(start_date, machine_id))
+        if not selected:
+            return {'data': [], 'records': 0, 'machines': 0}
+
+        days = np.concatenate([item[1] for item in selected])
+        columns = {
+            name: np.concatenate([item[2][name] for item in selected])
+            for name in ('oee', 'efficiency', 'output', 'downtime')
+        }
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        counts = np.bincount(inverse)
+        oee = np.bincount(inverse, weights=columns['oee']) / counts
+        efficiency = np.bincount(inverse, weights=columns['efficiency']) / counts
+        output = np.bincount(inverse, weights=columns['output'])
+        downtime = np.bincount(inverse, weights=columns['downtime'])
+
+        data = [
+            {
+                'date': day_to_date(day),
+                'oee': float(oee[i]),
+                'efficiency': float(efficiency[i]),
+                'output': float(output[i]),
+                'downtime': float(downtime[i]),
+            }
+            for i, day in enumerate(unique_days)
+        ]
+        return {'data': data, 'records': int(len(days)), 'machines': len(selected)}
+
+    def last_modified(self, machine_id: Optional[str] = None) -> Optional[datetime]:
+        """When rows were last added (for one machine or all), or ``None``.
+
+        Every :meth:`add` that keeps rows moves this forward, so it changes whenever the
+        answers of :meth:`summary` and :meth:`daily_trends` can.
+        """
+        if machine_id is not None:
+            machine = self._machines.get(machine_id)
+            return machine.modified if machine is not None else None
+        stamps = [machine.modified for machine in self._machines.values() if machine.modified is not None]
+        return max(stamps) if stamps else None
+
+    def machine_ids(self) -> List[str]:
+        return [machine_id for machine_id, machine in self._machines.items() if machine.size]
+
+    def series(self, machine_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """All hot rows of a machine as columns sorted by date, or ``None``."""
+        machine = self._machines.get(machine_id)
+        if machine is None or machine.size == 0:
+            return None
+        days, columns = machine.view()
+        order = np.argsort(days, kind='stable')
+        rows = {name: column[order] for name, column in columns.items()}
+        rows['day'] = days[order]
+        return rows
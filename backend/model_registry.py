@@ -0,0 +1,151 @@
+"""Versioned on-disk registry for the trained ML models.
+
+Every training run writes its models to ``<model_dir>/versions/<version>/`` and
+then atomically repoints ``<model_dir>/CURRENT`` at the new directory. Random
+forests are exported as node arrays (``<name>.forest/``, see :mod:`forest_arrays`)
+and served memory-mapped, so all workers share one copy of them through the page
+cache. Workers poll the pointer file, so a retrain in one worker is picked up by
+every other worker without a restart.
+
+Other estimators, versions written before the array export, and models trained
+before the registry existed (``<model_dir>/<name>_model.joblib``, loaded as version
+``1.0``) are unpickled with joblib: every worker then holds a private copy of them.
+
+joblib (and scikit-learn, when unpickling) is only imported once such a model is
+saved or loaded, keeping it off the API's import path.
+"""
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from forest_arrays import MappedForest, export_forest, is_exportable
+
+logger = logging.getLogger(__name__)
+
+LEGACY_VERSION = "1.0"
+LEGACY_MODELS = ('efficiency', 'oee')
+
+
+class ModelRegistry:
+    """Saves, loads and watches versions of the ML models.
+
+    ``models`` is the dict the API reads estimators from; it is updated in place
+    whenever a version is activated.
+    """
+
+    def __init__(self, model_dir: Path, models: Dict[str, object], keep_versions: int = 5):
+        self.model_dir = Path(model_dir)
+        self.versions_dir = self.model_dir / "versions"
+        self.pointer_path = self.model_dir / "CURRENT"
+        self.models = models
+        self.keep_versions = keep_versions
+        self.version: Optional[str] = None
+        self.metadata: dict = {}
+        self._pointer_mtime: Optional[int] = None
+
+    def current_version(self) -> Optional[str]:
+        """Version the ``CURRENT`` pointer refers to, if any."""
+        try:
+            return self.pointer_path.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, models: Dict[str, object], metadata: dict) -> str:
+        """Write a new version, make it current and activate it in this process."""
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        metadata = dict(metadata, version=version, created_at=datetime.now(timezone.utc).isoformat())
+
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.versions_dir / f".{version}.tmp"
+        staging.mkdir()
+        for name, model in models.items():
+            if is_exportable(model):
+                export_forest(model, staging / f"{name}.forest")
+            else:
+                import joblib
+
+                joblib.dump(model, staging / f"{name}.joblib")
+        (staging / "metadata.json").write_text(json.dumps(metadata, default=str))
+        os.replace(staging, self.versions_dir / version)
+
+        pointer_tmp = self.model_dir / f".CURRENT.{uuid.uuid4().hex}"
+        pointer_tmp.write_text(version)
+        os.replace(pointer_tmp, self.pointer_path)
+
+        # Serve the mapped arrays here too, rather than keeping the fitted copies
+        self.activate(*self.load_version(version))
+        self._prune()
+        return version
+
+    def load_version(self, version: Optional[str] = None) -> Optional[Tuple[str, Dict[str, object], dict]]:
+        """Load a version (the current one by default) without activating it."""
+        version = version or self.current_version()
+        if version is None:
+            return self._load_legacy()
+
+        path = self.versions_dir / version
+        metadata = json.loads((path / "metadata.json").read_text())
+        models = {artifact.stem: MappedForest(artifact) for artifact in sorted(path.glob("*.forest"))}
+        pickled = sorted(path.glob("*.joblib"))
+        if pickled:
+            import joblib
+
+            models.update((artifact.stem, joblib.load(artifact)) for artifact in pickled)
+        return version, models, metadata
+
+    def _load_legacy(self):
+        import joblib
+
+        paths = {name: self.model_dir / f"{name}_model.joblib" for name in LEGACY_MODELS}
+        if not all(path.exists() for path in paths.values()):
+            return None
+        models = {name: joblib.load(path) for name, path in paths.items()}
+        return LEGACY_VERSION, models, {'version': LEGACY_VERSION}
+
+    def activate(self, version: str, models: Dict[str, object], metadata: dict):
+        """Swap the served models. Must run on the event loop thread."""
+        self.models.clear()
+        self.models.update(models)
+        self.version = version
+        self.metadata = metadata
+        logger.info("Activated ML model version %s", version)
+
+    def load_current(self) -> Optional[Tuple[str, Dict[str, object], dict]]:
+        """Load the current version for activation; ``None`` if nothing was trained yet.
+
+        Safe to run in a thread; the caller activates the result on the event loop.
+        """
+        self._pointer_mtime = self._stat_pointer()
+        return self.load_version()
+
+    def poll(self) -> Optional[Tuple[str, Dict[str, object], dict]]:
+        """Load the current version if the pointer moved since the last check.
+
+        Cheap when nothing changed (a single ``stat``). Safe to run in a thread;
+        the caller activates the returned version on the event loop.
+        """
+        mtime = self._stat_pointer()
+        if mtime == self._pointer_mtime:
+            return None
+        self._pointer_mtime = mtime
+        version = self.current_version()
+        if version is None or version == self.version:
+            return None
+        return self.load_version(version)
+
+    def _stat_pointer(self) -> Optional[int]:
+        try:
+            return self.pointer_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _prune(self):
+        versions = sorted(path for path in self.versions_dir.iterdir() if not path.name.startswith('.'))
+        for path in versions[:-self.keep_versions]:
+            if path.name != self.version:
+                shutil.rmtree(path, ignore_errors=True)
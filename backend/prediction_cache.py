@@ -0,0 +1,28 @@
+"""In-process LRU cache of forecasts served by ``/ml/predict``.
+
+Entries are keyed by (machine_id, horizon, model_version, watermark, issued_on).
+The watermark is the digest of the machine's feature snapshot, so new production
+data, maintenance or a retrain (new model version) produce a new key. Stale
+forecasts are never served; they age out of the LRU. The ``predictions``
+collection is the shared, persistent layer behind this cache.
+"""
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, List[dict]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[List[dict]]:
+        predictions = self._entries.get(key)
+        if predictions is not None:
+            self._entries.move_to_end(key)
+        return predictions
+
+    def put(self, key: Hashable, predictions: List[dict]):
+        self._entries[key] = predictions
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
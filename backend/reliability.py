@@ -0,0 +1,299 @@
+"""Maintenance analytics: MTBF, MTTR and failure rates per machine.
+
+Reliability is derived from per-machine counters kept in the
+``machine_reliability`` collection:
+
+* ``failures`` / ``repair_hours`` - corrective maintenance logs and their duration
+* ``maintenance_events`` / ``maintenance_hours`` - all maintenance logs
+* ``production_records`` / ``downtime_minutes`` - production data rows and their downtime
+* ``production_days`` - distinct days with production data, the basis of planned time
+
+A machine may report many records per day, so distinct days are tracked in the
+``production_days`` collection (one document per machine and date, unique):
+the write that inserts a day increments the counter.
+
+The counters are rebuilt from scratch with aggregation pipelines
+(:func:`rebuild`) and then kept current with ``$inc`` updates as maintenance
+logs and production records are written, so reading reliability for the whole
+fleet never rescans the raw collections. Archived production rows are counted
+through their ``production_monthly`` rollups.
+
+A rebuild counts what was written before its start and applies the difference
+to the counters with ``$inc``, so increments made while it runs are kept.
+Writes in flight when it starts are the exception (see :func:`rebuild`).
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Maintenance log types that represent a failure (anything else, e.g. "preventive", is planned work)
+FAILURE_TYPES = ('corrective', 'breakdown', 'repair', 'failure', 'emergency', 'unplanned')
+
+COUNTER_FIELDS = (
+    'failures',
+    'repair_hours',
+    'maintenance_events',
+    'maintenance_hours',
+    'production_records',
+    'downtime_minutes',
+    'production_days',
+)
+DUPLICATE_KEY = 11000
+# Creation time given to rows written before created_at existed
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1)
+
+
+def is_failure(maintenance_type: Optional[str]) -> bool:
+    return (maintenance_type or '').strip().lower() in FAILURE_TYPES
+
+
+async def record_maintenance(collection, log: dict):
+    """Fold a newly created maintenance log into the machine's counters."""
+    failure = is_failure(log.get('type'))
+    duration = float(log.get('duration') or 0.0)
+    update = {
+        '$inc': {
+            'maintenance_events': 1,
+            'maintenance_hours': duration,
+            'failures': 1 if failure else 0,
+            'repair_hours': duration if failure else 0.0,
+        },
+        '$set': {'updated_at': datetime.now(timezone.utc)},
+        '$setOnInsert': {'production_records': 0, 'downtime_minutes': 0.0, 'production_days': 0},
+    }
+    if failure:
+        update['$max'] = {'last_failure_date': log.get('date')}
+    await collection.update_one({'machine_id': log['machine_id']}, update, upsert=True)
+
+
+async def insert_days(days_collection, first_seen: Dict[Tuple[str, str], datetime]) -> Dict[str, int]:
+    """Insert missing ``production_days`` documents; returns the new days per machine."""
+    keys = list(first_seen)
+    operations = [
+        UpdateOne(
+            {'machine_id': machine_id, 'date': day},
+            {'$setOnInsert': {'month': day[:7], 'created_at': first_seen[(machine_id, day)]}},
+            upsert=True,
+        )
+        for machine_id, day in keys
+    ]
+    try:
+        result = await days_collection.bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        # A concurrent write inserted the same day first; that write counts it
+        if any(error.get('code') != DUPLICATE_KEY for error in e.details.get('writeErrors', [])):
+            raise
+        upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+
+    new_days: Dict[str, int] = {}
+    for index in upserted:
+        machine_id = keys[index][0]
+        new_days[machine_id] = new_days.get(machine_id, 0) + 1
+    return new_days
+
+
+async def record_production(collection, days_collection, records: Iterable[dict]):
+    """Fold newly inserted production records into the machines' counters."""
+    totals: Dict[str, List[float]] = {}
+    first_seen: Dict[Tuple[str, str], datetime] = {}
+    for record in records:
+        counts = totals.setdefault(record['machine_id'], [0, 0.0])
+        counts[0] += 1
+        counts[1] += float(record.get('downtime') or 0.0)
+        key = (record['machine_id'], record['date'])
+        created_at = record.get('created_at') or UNKNOWN_CREATED_AT
+        if key not in first_seen or created_at < first_seen[key]:
+            first_seen[key] = created_at
+    if not totals:
+        return
+
+    new_days = await insert_days(days_collection, first_seen)
+    updated_at = datetime.now(timezone.utc)
+    await collection.bulk_write([
+        UpdateOne(
+            {'machine_id': machine_id},
+            {
+                '$inc': {
+                    'production_records': count,
+                    'downtime_minutes': downtime,
+                    'production_days': new_days.get(machine_id, 0),
+                },
+                '$set': {'updated_at': updated_at},
+            },
+            upsert=True,
+        )
+        for machine_id, (count, downtime) in totals.items()
+    ], ordered=False)
+
+
+def _written_before(moment: datetime) -> dict:
+    return {'$or': [{'created_at': {'$lt': moment}}, {'created_at': {'$exists': False}}]}
+
+
+async def _seed_days(source_db, moment: datetime, batch_size: int = 1000):
+    """Insert the ``production_days`` of rows written before ``moment`` (idempotent)."""
+    pipeline = [
+        {'$match': _written_before(moment)},
+        {'$group': {'_id': {'machine_id': '$machine_id', 'date': '$date'}, 'created_at': {'$min': '$created_at'}}},
+    ]
+    first_seen: Dict[Tuple[str, str], datetime] = {}
+    async for row in source_db.production_data.aggregate(pipeline, allowDiskUse=True):
+        first_seen[(row['_id']['machine_id'], row['_id']['date'])] = row['created_at'] or UNKNOWN_CREATED_AT
+        if len(first_seen) >= batch_size:
+            await insert_days(source_db.production_days, first_seen)
+            first_seen = {}
+    if first_seen:
+        await insert_days(source_db.production_days, first_seen)
+
+
+async def rebuild(source_db, collection) -> int:
+    """Recompute every machine's counters from ``maintenance_logs`` and ``production_data``.
+
+    ``source_db`` must read from the primary. Everything written before the rebuild
+    started is counted with server-side ``$group`` stages; each counter is then moved
+    to that count with ``$inc`` by the difference to its value at the start, which
+    keeps the increments of writes made meanwhile. Returns the number of machines updated.
+
+    The cut is not atomic with the writers. A write stamps ``created_at``, inserts its
+    rows, then runs its ``$inc``. If that write stamped ``created_at`` before the rebuild
+    started but runs its ``$inc`` after the snapshot, it is counted twice: once by the
+    ``$group`` and once by its own increment. The error is bounded by the batches in flight
+    at that instant. Run rebuilds when ingestion is quiet (they are an admin repair tool),
+    or run a second rebuild once ingestion has paused to correct the counters.
+    """
+    # Read right before the cut, so the window for in-flight writes (above) stays short
+    snapshot = {
+        row['machine_id']: row
+        async for row in collection.find({}, {'_id': 0})
+    }
+    started_at = datetime.now(timezone.utc)
+    await _seed_days(source_db, started_at)
+
+    failure_expr = {'$in': [{'$toLower': {'$ifNull': ['$type', '']}}, list(FAILURE_TYPES)]}
+    maintenance_pipeline = [
+        {'$match': _written_before(started_at)},
+        {'$group': {
+            '_id': '$machine_id',
+            'maintenance_events': {'$sum': 1},
+            'maintenance_hours': {'$sum': '$duration'},
+            'failures': {'$sum': {'$cond': [failure_expr, 1, 0]}},
+            'repair_hours': {'$sum': {'$cond': [failure_expr, '$duration', 0]}},
+            'last_failure_date': {'$max': {'$cond': [failure_expr, '$date', None]}},
+        }},
+    ]
+    production_pipeline = [
+        {'$match': _written_before(started_at)},
+        {'$group': {
+            '_id': '$machine_id',
+            'production_records': {'$sum': 1},
+            'downtime_minutes': {'$sum': '$downtime'},
+        }},
+    ]
+    days_pipeline = [
+        {'$match': {'created_at': {'$lt': started_at}}},
+        {'$group': {'_id': {'machine_id': '$machine_id', 'month': '$month'}, 'days': {'$sum': 1}}},
+    ]
+    # Raw rows moved to the archive are still counted through their monthly rollups
+    archived_pipeline = [
+        {'$project': {'_id': 0, 'machine_id': 1, 'month': 1, 'records': 1, 'downtime_sum': 1, 'days': 1}},
+    ]
+
+    counters: Dict[str, dict] = {}
+    async for row in source_db.maintenance_logs.aggregate(maintenance_pipeline, allowDiskUse=True):
+        counters[row.pop('_id')] = row
+    async for row in source_db.production_data.aggregate(production_pipeline, allowDiskUse=True):
+        counters.setdefault(row.pop('_id'), {}).update(row)
+    day_months = set()
+    async for row in source_db.production_days.aggregate(days_pipeline, allowDiskUse=True):
+        machine_id = row['_id']['machine_id']
+        day_months.add((machine_id, row['_id']['month']))
+        values = counters.setdefault(machine_id, {})
+        values['production_days'] = values.get('production_days', 0) + row['days']
+    async for row in source_db.production_monthly.aggregate(archived_pipeline):
+        values = counters.setdefault(row['machine_id'], {})
+        values['production_records'] = (values.get('production_records') or 0) + row.get('records', 0)
+        values['downtime_minutes'] = (values.get('downtime_minutes') or 0) + row.get('downtime_sum', 0)
+        if (row['machine_id'], row['month']) not in day_months:
+            # Archived before days were tracked; rollups without a day count cap at the month length
+            days = row.get('days', min(row.get('records', 0), 31))
+            values['production_days'] = values.get('production_days', 0) + days
+
+    updated_at = datetime.now(timezone.utc)
+    operations = []
+    for machine_id in counters.keys() | snapshot.keys():
+        values, previous = counters.get(machine_id, {}), snapshot.get(machine_id, {})
+        increments = {
+            field: (values.get(field) or 0) - (previous.get(field) or 0)
+            for field in COUNTER_FIELDS
+        }
+        update = {'$inc': increments, '$set': {'updated_at': updated_at, 'rebuilt_at': started_at}}
+        if values.get('last_failure_date') is not None:
+            # $max, as a failure logged during the rebuild may already have moved it
+            update['$max'] = {'last_failure_date': values['last_failure_date']}
+        operations.append(UpdateOne({'machine_id': machine_id}, update, upsert=True))
+    for start in range(0, len(operations), 1000):
+        await collection.bulk_write(operations[start:start + 1000], ordered=False)
+    return len(operations)
+
+
+def _operating_hours(counters: dict, planned_production_time: float) -> float:
+    planned_minutes = float(counters.get('production_days') or 0) * planned_production_time
+    return max(0.0, planned_minutes - float(counters.get('downtime_minutes') or 0.0)) / 60.0
+
+
+def _metrics(operating_hours: float, failures: int, repair_hours: float) -> dict:
+    mtbf = operating_hours / max(1, failures)
+    mttr = repair_hours / failures if failures else 0.0
+    return {
+        'operating_hours': round(operating_hours, 2),
+        'failures': failures,
+        'mtbf_hours': round(mtbf, 2),
+        'mttr_hours': round(mttr, 2),
+        'failure_rate_per_1000h': round(failures / operating_hours * 1000, 4) if operating_hours else 0.0,
+        'availability': round(mtbf / (mtbf + mttr), 4) if mtbf + mttr else 0.0,
+    }
+
+
+def derive_metrics(counters: dict, planned_production_time: float) -> dict:
+    """MTBF/MTTR (hours), failure rate and inherent availability from a counter document.
+
+    Operating time is the planned production time of every day with production data,
+    minus recorded downtime. With no recorded failure, MTBF is reported as the observed
+    operating time (a lower bound).
+    """
+    metrics = {'machine_id': counters.get('machine_id')}
+    metrics.update(_metrics(
+        _operating_hours(counters, planned_production_time),
+        int(counters.get('failures') or 0),
+        float(counters.get('repair_hours') or 0.0),
+    ))
+    metrics.update({
+        'maintenance_events': int(counters.get('maintenance_events') or 0),
+        'maintenance_hours': round(float(counters.get('maintenance_hours') or 0.0), 2),
+        'last_failure_date': counters.get('last_failure_date'),
+    })
+    return metrics
+
+
+def fleet_summary(counters: Iterable[dict], planned_times: Dict[str, float], default_planned_time: float) -> dict:
+    """Fleet-wide reliability, pooling operating time, failures and repair time across machines."""
+    machines = failures = maintenance_events = 0
+    operating_hours = repair_hours = maintenance_hours = 0.0
+    for row in counters:
+        machines += 1
+        operating_hours += _operating_hours(row, planned_times.get(row.get('machine_id'), default_planned_time))
+        failures += int(row.get('failures') or 0)
+        repair_hours += float(row.get('repair_hours') or 0.0)
+        maintenance_events += int(row.get('maintenance_events') or 0)
+        maintenance_hours += float(row.get('maintenance_hours') or 0.0)
+
+    summary = {'machines': machines}
+    summary.update(_metrics(operating_hours, failures, repair_hours))
+    summary.update({
+        'maintenance_events': maintenance_events,
+        'maintenance_hours': round(maintenance_hours, 2),
+    })
+    return summary
@@ -0,0 +1,251 @@
+"""Data retention: prediction TTL, monthly rollups and Parquet archives.
+
+Three tiers keep ``production_data`` small:
+
+* raw rows stay in MongoDB for ``retain_days`` (rounded down to whole months);
+* older months are written to zstd-compressed Parquet files under
+  ``<archive_dir>/production_data/month=YYYY-MM/`` and deleted from MongoDB;
+* ``production_monthly`` keeps one summary document per machine and month,
+  recomputed from the month's archive files.
+
+A month is archived in three steps: write a Parquet part, then rewrite the
+month's rollup from all of its parts, then delete the archived raw rows.
+Re-running after a crash at any step is safe. Archive reads and rollups drop
+duplicate ``id`` values, so a part written twice is harmless.
+
+``predictions`` expire through a TTL index on ``created_at``.
+
+pyarrow is only imported when archives are written or read.
+"""
+import asyncio
+import logging
+import os
+import re
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = ('output', 'downtime', 'efficiency', 'oee', 'quality_rate', 'availability', 'performance')
+DELETE_CHUNK_SIZE = 1000
+INDEX_OPTIONS_CONFLICT = 85
+ISO_DAY = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _archive_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [('id', pa.string()), ('machine_id', pa.string()), ('date', pa.string())]
+        + [(field, pa.float64()) for field in METRIC_FIELDS]
+        + [('created_at', pa.timestamp('us', tz='UTC'))]
+    )
+
+
+def parse_day(value) -> Optional[date]:
+    """Day of a ``YYYY-MM-DD`` string (anything after the day is ignored), else None."""
+    if not isinstance(value, str) or not ISO_DAY.match(value):
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+async def _oldest_day(collection, before: str) -> Optional[date]:
+    """Earliest parseable ``date`` below ``before``, stepping over malformed values."""
+    bound = {'$lt': before}
+    while True:
+        doc = await collection.find_one({'date': bound}, {'_id': 0, 'date': 1}, sort=[('date', 1)])
+        if doc is None:
+            return None
+        day = parse_day(doc['date'])
+        if day is not None:
+            return day
+        bound = {'$gt': doc['date'], '$lt': before}
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _month_dir(archive_dir: Path, month: str) -> Path:
+    return Path(archive_dir) / 'production_data' / f'month={month}'
+
+
+async def ensure_prediction_ttl(collection, ttl_days: int):
+    """Expire predictions ``ttl_days`` after creation, updating an existing TTL in place."""
+    seconds = int(ttl_days * 86400)
+    try:
+        await collection.create_index('created_at', expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            'collMod', collection.name,
+            index={'keyPattern': {'created_at': 1}, 'expireAfterSeconds': seconds}
+        )
+
+
+async def acquire_lease(collection, name: str, owner: str, seconds: float) -> bool:
+    """Take (or renew) a named lease so only one worker runs a job at a time."""
+    now = datetime.now(timezone.utc)
+    try:
+        await collection.find_one_and_update(
+            {'_id': name, '$or': [{'expires_at': {'$lt': now}}, {'owner': owner}]},
+            {'$set': {'owner': owner, 'expires_at': now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_lease(collection, name: str, owner: str):
+    await collection.delete_one({'_id': name, 'owner': owner})
+
+
+def write_part(archive_dir: Path, month: str, rows: List[dict]) -> Path:
+    """Write rows as a new Parquet part of ``month`` (atomically). Blocking."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _archive_schema()
+    table = pa.Table.from_pylist([{name: row.get(name) for name in schema.names} for row in rows], schema=schema)
+    directory = _month_dir(archive_dir, month)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"part-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+    staging = directory / f'.{name}.tmp'
+    pq.write_table(table, staging, compression='zstd')
+    os.replace(staging, directory / name)
+    return directory / name
+
+
+def _deduplicate(table):
+    import numpy as np
+
+    _, first = np.unique(table.column('id').to_numpy(zero_copy_only=False), return_index=True)
+    return table.take(np.sort(first)) if len(first) < table.num_rows else table
+
+
+def month_rollup(archive_dir: Path, month: str) -> List[dict]:
+    """Per-machine summary of every archived row of ``month``. Blocking."""
+    import pyarrow.parquet as pq
+
+    directory = _month_dir(archive_dir, month)
+    parts = sorted(directory.glob('part-*.parquet'))
+    if not parts:
+        return []
+    table = _deduplicate(pq.ParquetDataset(parts, schema=_archive_schema()).read())
+    aggregates = [('id', 'count'), ('date', 'count_distinct'), ('date', 'min'), ('date', 'max')]
+    aggregates.extend((field, 'sum') for field in METRIC_FIELDS)
+    grouped = table.group_by('machine_id').aggregate(aggregates).to_pylist()
+
+    archived_at = datetime.now(timezone.utc)
+    rollups = []
+    for row in grouped:
+        records = row['id_count']
+        rollup = {
+            'machine_id': row['machine_id'],
+            'month': month,
+            'records': records,
+            'days': row['date_count_distinct'],
+            'first_date': row['date_min'],
+            'last_date': row['date_max'],
+            'archived_at': archived_at,
+        }
+        for field in METRIC_FIELDS:
+            total = row[f'{field}_sum'] or 0.0
+            rollup[f'{field}_sum'] = total
+            rollup[f'average_{field}'] = round(total / records, 4) if records else 0.0
+        rollups.append(rollup)
+    return rollups
+
+
+def read_archive(
+    archive_dir: Path,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    machine_id: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Archived production rows in a date range (inclusive), oldest first. Blocking.
+
+    ``created_at`` is returned as naive UTC, like the rows read from MongoDB.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    root = Path(archive_dir) / 'production_data'
+    if not root.exists():
+        return []
+    dataset = ds.dataset(root, format='parquet', partitioning='hive', schema=_archive_schema(),
+                         exclude_invalid_files=True)
+    condition = None
+    for expression in (
+        ds.field('date') >= start_date if start_date else None,
+        ds.field('date') <= end_date if end_date else None,
+        ds.field('machine_id') == machine_id if machine_id else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    table = _deduplicate(dataset.to_table(filter=condition)).sort_by('date')
+    if limit is not None:
+        table = table.slice(0, limit)
+    index = table.schema.get_field_index('created_at')
+    table = table.set_column(index, 'created_at', table.column('created_at').cast(pa.timestamp('us')))
+    return table.to_pylist()
+
+
+async def compact(db, archive_dir: Path, retain_days: int, batch_size: int = 5000) -> dict:
+    """Archive and roll up every whole month older than ``retain_days``; returns a summary.
+
+    Rows whose ``date`` is not ``YYYY-MM-DD`` (written before ingest validated it) are
+    left in place rather than archived into the wrong month; ``skipped`` counts those
+    that fell inside an archived month's range.
+    """
+    cutoff = _month_start(date.today() - timedelta(days=retain_days))
+    oldest = await _oldest_day(db.production_data, cutoff.isoformat())
+    summary = {'cutoff': cutoff.isoformat(), 'months': [], 'archived': 0, 'deleted': 0, 'skipped': 0}
+    if oldest is None:
+        return summary
+
+    month = _month_start(oldest)
+    while month < cutoff:
+        following = _next_month(month)
+        label = month.strftime('%Y-%m')
+        query = {'date': {'$gte': month.isoformat(), '$lt': following.isoformat()}}
+        rows = await db.production_data.find(query, {'_id': 0}).batch_size(batch_size).to_list(None)
+        valid = [row for row in rows if month <= (parse_day(row['date']) or following) < following]
+        if len(valid) < len(rows):
+            logger.warning("Skipped %d production rows of %s with malformed dates", len(rows) - len(valid), label)
+            summary['skipped'] += len(rows) - len(valid)
+        rows = valid
+        if rows:
+            await asyncio.to_thread(write_part, archive_dir, label, rows)
+            rollups = await asyncio.to_thread(month_rollup, archive_dir, label)
+            await db.production_monthly.bulk_write([
+                ReplaceOne({'machine_id': rollup['machine_id'], 'month': label}, rollup, upsert=True)
+                for rollup in rollups
+            ], ordered=False)
+
+            ids = [row['id'] for row in rows]
+            for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+                result = await db.production_data.delete_many(
+                    dict(query, id={'$in': ids[start:start + DELETE_CHUNK_SIZE]})
+                )
+                summary['deleted'] += result.deleted_count
+            summary['archived'] += len(rows)
+            summary['months'].append(label)
+            logger.info("Archived %d production rows of %s", len(rows), label)
+        month = following
+    return summary
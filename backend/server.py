@@ -1,46 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, APIRouter
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, APIRouter, Body, Query, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Any, Type
+from functools import lru_cache
 import uuid
 from datetime import datetime, timezone, timedelta
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-import joblib
 import io
 import json
+import base64
+import re
 import jwt
-from passlib.context import CryptContext
 import random
+import socket
+# pandas, scikit-learn, joblib and passlib are imported inside the code paths that
+# use them, so a worker that only serves health checks or auth starts fast.
+
+from db_pool import PoolMetrics, analytics_read_preference, client_options
+from hot_store import HotProductionStore
+from model_registry import ModelRegistry
+import reliability
+import retention
+import training
+import tuning
+import versions
+from anomaly import AnomalyDetector
+from admission import AdmissionController, Policy, Rejected, policy_from_env
+from feature_store import FeatureStore, FEATURE_COLUMNS, FEATURE_SET, TARGETS, feature_matrix
+from prediction_cache import PredictionCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_metrics = {}
+
+def create_mongo_client(role: str) -> AsyncIOMotorClient:
+    options = client_options(role)
+    pool_metrics[role] = PoolMetrics(default_max_pool_size=options['maxPoolSize'])
+    return AsyncIOMotorClient(mongo_url, event_listeners=[pool_metrics[role]], **options)
+
+client = create_mongo_client('default')
 db = client[os.environ['DB_NAME']]
 
+# Analytics and training reads get their own pool and prefer secondaries,
+# so they do not compete with ingestion writes for primary connections
+analytics_client = create_mongo_client('analytics')
+analytics_db = analytics_client.get_database(os.environ['DB_NAME'], read_preference=analytics_read_preference())
+
 # JWT and Password Setup
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-here')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-# Create the main app without a prefix
-app = FastAPI(title="Industrial Analytics Platform", version="1.0.0")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -48,6 +76,85 @@ api_router = APIRouter(prefix="/api")
 ml_models = {}
 model_dir = ROOT_DIR / "ml_models"
 model_dir.mkdir(exist_ok=True)
+model_registry = ModelRegistry(model_dir, ml_models)
+
+# Multi-worker mode: each worker tails writes and model versions from the others
+MULTI_WORKER = os.environ.get('MULTI_WORKER') == '1' or int(os.environ.get('WEB_CONCURRENCY', '1')) > 1
+STATE_SYNC_INTERVAL = float(os.environ.get('STATE_SYNC_INTERVAL', '5'))
+# Load the current model in the background at startup instead of on the first prediction
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '1') == '1'
+model_load_task: Optional[asyncio.Task] = None
+# First import of scikit-learn/joblib, shared by every code path that uses them from a thread
+ml_imports_task: Optional[asyncio.Task] = None
+
+# OEE defaults
+DEFAULT_PLANNED_PRODUCTION_TIME = 480.0  # minutes per day
+PRODUCTION_BATCH_MAX = int(os.environ.get('PRODUCTION_BATCH_MAX', '10000'))
+INSERT_CHUNK_SIZE = 1000
+SIMULATE_BATCH_SIZE = int(os.environ.get('SIMULATE_BATCH_SIZE', '1000'))
+
+# Machine listing
+MACHINES_PAGE_MAX = 1000
+LATEST_KPI_FIELDS = ('output', 'downtime', 'efficiency', 'oee', 'availability', 'performance', 'quality_rate')
+planned_time_cache: Dict[str, float] = {}
+
+# Admission control for the ingestion endpoints: per-user token buckets and per-group
+# concurrency limits (routes of a group share the limits of its first policy)
+admission = AdmissionController(
+    {
+        'production': policy_from_env('production', Policy(
+            rate=20, burst=40, group='ingest', max_concurrent=32, max_queue=64
+        )),
+        'production_batch': policy_from_env('production_batch', Policy(
+            rate=2, burst=5, group='ingest', max_concurrent=32, max_queue=64
+        )),
+        'upload_csv': policy_from_env('upload_csv', Policy(
+            rate=0.2, burst=2, group='bulk', max_concurrent=2, max_queue=4, queue_timeout=10.0
+        )),
+        'simulate': policy_from_env('simulate', Policy(
+            rate=0.5, burst=2, group='bulk', max_concurrent=2, max_queue=4, queue_timeout=10.0
+        ))
+    },
+    enabled=os.environ.get('ADMISSION_ENABLED', '1') == '1'
+)
+
+# Online anomaly detection on every production record written through the API
+anomaly_detector = AnomalyDetector(
+    z_threshold=float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.0')),
+    min_samples=int(os.environ.get('ANOMALY_MIN_SAMPLES', '10')),
+    alpha=float(os.environ.get('ANOMALY_EWMA_ALPHA', '0.1'))
+)
+
+# Recent production data held in memory as NumPy columns for the analytics endpoints
+hot_store = HotProductionStore(window_days=int(os.environ.get('HOT_STORE_DAYS', '90')))
+
+# Latest write time per collection and machine, the validators of the polled read endpoints
+# (kept in MongoDB when several workers must hand out the same ETags)
+write_versions = versions.WriteVersions(db.write_versions if MULTI_WORKER else None)
+
+# Retention: predictions expire and whole months older than RAW_RETENTION_DAYS move to Parquet
+RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', '1') == '1'
+PREDICTION_TTL_DAYS = int(os.environ.get('PREDICTION_TTL_DAYS', '30'))
+# Never archive rows the hot store still serves
+RAW_RETENTION_DAYS = max(int(os.environ.get('RAW_RETENTION_DAYS', '365')), hot_store.window_days)
+RETENTION_INTERVAL_HOURS = float(os.environ.get('RETENTION_INTERVAL_HOURS', '24'))
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', str(ROOT_DIR / 'archive')))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Rolling-window ML features, materialised from the hot store as records arrive
+feature_store = FeatureStore(hot_store)
+TRAINING_MAX_ROWS = int(os.environ.get('TRAINING_MAX_ROWS', '100000'))
+# Models are trained per machine 'type' or 'site' (or one 'global' model) across a process pool
+TRAINING_PARTITION_BY = os.environ.get('TRAINING_PARTITION_BY', 'type')
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', str(os.cpu_count() or 1)))
+# Forecasts memoised by (machine, horizon, model version, feature watermark, issue date)
+prediction_cache = PredictionCache(max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', '1024')))
+# Hyperparameter searches running in this worker, by job id. Running jobs refresh a
+# heartbeat; one whose heartbeat stopped lost its worker and is marked failed at startup
+tuning_tasks: Dict[str, asyncio.Task] = {}
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', '60'))
+# Feature list of models trained before the feature store
+LEGACY_FEATURES = ['output', 'downtime', 'day_of_week', 'month']
 
 # Pydantic Models
 class User(BaseModel):
@@ -78,13 +185,18 @@ class Machine(BaseModel):
     type: str
     site: str
     status: str = "operational"
+    planned_production_time: float = DEFAULT_PLANNED_PRODUCTION_TIME
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MachineSummary(Machine):
+    latest_kpis: Optional[Dict[str, Any]] = None
+
 class MachineCreate(BaseModel):
     name: str
     type: str
     site: str
     status: str = "operational"
+    planned_production_time: float = Field(default=DEFAULT_PLANNED_PRODUCTION_TIME, gt=0)
 
 class ProductionData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -99,6 +211,10 @@ class ProductionData(BaseModel):
     performance: float = 1.0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+def is_iso_day(value) -> bool:
+    """True for a ``YYYY-MM-DD`` string naming a real day"""
+    return isinstance(value, str) and len(value) == 10 and retention.parse_day(value) is not None
+
 class ProductionDataCreate(BaseModel):
     machine_id: str
     date: str
@@ -107,6 +223,13 @@ class ProductionDataCreate(BaseModel):
     efficiency: float
     quality_rate: float = 1.0
 
+    @field_validator('date')
+    @classmethod
+    def check_date(cls, value: str) -> str:
+        if not is_iso_day(value):
+            raise ValueError("date must be YYYY-MM-DD")
+        return value
+
 class MaintenanceLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     machine_id: str
@@ -133,8 +256,38 @@ class Prediction(BaseModel):
     predicted_oee: float
     confidence: float
     model_version: str = "1.0"
+    watermark: Optional[str] = None
+    issued_on: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Alert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    machine_id: str
+    production_id: Optional[str] = None
+    date: str
+    metric: str
+    value: float
+    expected: float
+    std: float
+    z_score: float
+    severity: str = "warning"
+    acknowledged: bool = False
+    acknowledged_by: Optional[str] = None
+    acknowledged_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class MLJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str
+    status: str = "queued"
+    params: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class DashboardKPIs(BaseModel):
     total_machines: int
     average_oee: float
@@ -145,11 +298,44 @@ class DashboardKPIs(BaseModel):
     maintenance_alerts: int
 
 # Helper Functions
+@lru_cache(maxsize=None)
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection selecting exactly the fields of ``model``."""
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in model.model_fields})
+    return projection
+
+@lru_cache(maxsize=None)
+def _model_defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+def db_rows_response(model: Type[BaseModel], docs: List[dict]) -> ORJSONResponse:
+    """Serialise documents read with ``model_projection`` straight to JSON.
+
+    The documents were validated when they were written, so this skips building a
+    pydantic model per row and FastAPI's second validation against ``response_model``.
+    Missing optional fields are filled with the model defaults.
+    """
+    defaults = _model_defaults(model)
+    for doc in docs:
+        for name, value in defaults.items():
+            doc.setdefault(name, value)
+    return ORJSONResponse(docs)
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -175,19 +361,139 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="User not found")
     return User(**user)
 
-def calculate_oee(output: float, downtime: float, efficiency: float, quality_rate: float = 1.0, planned_production_time: float = 480.0):
-    """Calculate OEE (Overall Equipment Effectiveness)"""
-    availability = max(0, (planned_production_time - downtime) / planned_production_time)
-    performance = min(1.0, efficiency / 100.0)  # Assuming efficiency is a percentage
-    quality = quality_rate
+def admit(route: str):
+    """Dependency holding an admission slot for the request; 429/503 with Retry-After when rejected"""
+    async def dependency(current_user: User = Depends(get_current_user)):
+        try:
+            async with admission.admit(route, current_user.id):
+                yield
+        except Rejected as e:
+            raise HTTPException(
+                status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)}
+            )
+    return dependency
+
+def local_midnight() -> datetime:
+    """Start of today in server local time, as an aware UTC datetime"""
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+
+async def conditional_get(request: Request, scope: str, keys: List[str], *extra: Optional[datetime], **params):
+    """Validators of a polled response: (headers, whether the client's copy is current).
+
+    The windows of these endpoints are relative to today, so local midnight counts as a write.
+    """
+    last_modified = await write_versions.last_modified(keys, local_midnight(), *extra)
+    tag = versions.etag(scope, last_modified, **params)
+    headers = {
+        "ETag": tag,
+        "Last-Modified": versions.http_date(last_modified),
+        "Cache-Control": "private, no-cache"
+    }
+    return headers, versions.matches(request.headers.get("if-none-match"), tag)
+
+def calculate_oee_batch(output, downtime, efficiency, quality_rate=1.0, planned_production_time=DEFAULT_PLANNED_PRODUCTION_TIME):
+    """Vectorised OEE over arrays (or DataFrame columns) of production records.
+
+    Every argument may be a scalar or an array-like; scalars are broadcast. Returns
+    'oee', 'availability', 'performance' and 'quality' as percentages, in NumPy arrays.
+    """
+    downtime = np.asarray(downtime, dtype=float)
+    efficiency = np.asarray(efficiency, dtype=float)
+    quality = np.asarray(quality_rate, dtype=float)
+    planned = np.asarray(planned_production_time, dtype=float)
+    
+    availability = np.maximum(0.0, (planned - downtime) / planned)
+    performance = np.minimum(1.0, efficiency / 100.0)
     oee = availability * performance * quality
+    shape = oee.shape
+    return {
+        'oee': np.round(oee * 100, 2),
+        'availability': np.round(np.broadcast_to(availability, shape) * 100, 2),
+        'performance': np.round(np.broadcast_to(performance, shape) * 100, 2),
+        'quality': np.round(np.broadcast_to(quality, shape) * 100, 2)
+    }
+
+def machine_document(machine: Machine) -> dict:
+    """Stored form of a machine, with the lowercased name used for search and ordering"""
+    document = machine.dict()
+    document['name_lower'] = machine.name.lower()
+    return document
+
+async def get_planned_production_times(machine_ids) -> Dict[str, float]:
+    """Planned production time (minutes) per machine, defaulting to 480."""
+    machine_ids = set(machine_ids)
+    missing = [machine_id for machine_id in machine_ids if machine_id not in planned_time_cache]
+    if missing:
+        async for machine in db.machines.find(
+            {"id": {"$in": missing}}, {"_id": 0, "id": 1, "planned_production_time": 1}
+        ):
+            planned_time_cache[machine["id"]] = float(
+                machine.get("planned_production_time") or DEFAULT_PLANNED_PRODUCTION_TIME
+            )
     return {
-        'oee': round(oee * 100, 2),
-        'availability': round(availability * 100, 2),
-        'performance': round(performance * 100, 2),
-        'quality': round(quality * 100, 2)
+        machine_id: planned_time_cache.get(machine_id, DEFAULT_PLANNED_PRODUCTION_TIME)
+        for machine_id in machine_ids
     }
 
+async def insert_production_records(rows: List[dict]) -> List[dict]:
+    """Compute OEE for raw production rows in one vectorised pass and bulk insert them.
+
+    Rows need ``machine_id``, ``date``, ``output``, ``downtime``, ``efficiency`` and
+    optionally ``quality_rate``. Returns the stored documents.
+    """
+    if not rows:
+        return []
+    
+    planned = await get_planned_production_times(row['machine_id'] for row in rows)
+    oee_data = calculate_oee_batch(
+        [row['output'] for row in rows],
+        [row['downtime'] for row in rows],
+        [row['efficiency'] for row in rows],
+        [row.get('quality_rate', 1.0) for row in rows],
+        [planned[row['machine_id']] for row in rows]
+    )
+    oee_columns = {key: values.tolist() for key, values in oee_data.items()}
+    
+    created_at = datetime.now(timezone.utc)
+    records = []
+    for i, row in enumerate(rows):
+        record = dict(row)
+        for key, values in oee_columns.items():
+            record[key] = values[i]
+        record['id'] = str(uuid.uuid4())
+        record['created_at'] = created_at
+        records.append(record)
+    
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        await db.production_data.insert_many(records[start:start + INSERT_CHUNK_SIZE], ordered=False)
+    
+    hot_store.add(records)
+    await reliability.record_production(db.machine_reliability, db.production_days, records)
+    
+    alerts = anomaly_detector.observe_many(records)
+    if alerts:
+        await db.alerts.insert_many(alerts)
+        await write_versions.touch("alerts", machine_ids=[alert['machine_id'] for alert in alerts])
+    await write_versions.touch(
+        "production_data", "machine_reliability", machine_ids=[record['machine_id'] for record in records]
+    )
+    await feature_store.materialize(db, records)
+    return records
+
+async def find_existing_production_keys(rows: List[dict]) -> set:
+    """(machine_id, date) pairs among ``rows`` that are already stored, in one query."""
+    if not rows:
+        return set()
+    dates = [row['date'] for row in rows]
+    cursor = db.production_data.find(
+        {
+            "machine_id": {"$in": list({row['machine_id'] for row in rows})},
+            "date": {"$gte": min(dates), "$lte": max(dates)}
+        },
+        {"_id": 0, "machine_id": 1, "date": 1}
+    )
+    return {(doc['machine_id'], doc['date']) async for doc in cursor}
+
 async def generate_sample_data():
     """Generate sample data for demonstration"""
     # Create sample machines
@@ -203,40 +509,34 @@ async def generate_sample_data():
         existing = await db.machines.find_one({"name": machine_data["name"]})
         if not existing:
             machine = Machine(**machine_data)
-            await db.machines.insert_one(machine.dict())
+            await db.machines.insert_one(machine_document(machine))
+            await write_versions.touch("machines", machine_ids=[machine.id])
             machine_ids.append(machine.id)
         else:
             machine_ids.append(existing["id"])
     
     # Generate production data for the last 30 days
+    dates = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(30)]
+    existing = await find_existing_production_keys(
+        [{"machine_id": machine_id, "date": date} for machine_id in machine_ids for date in dates]
+    )
+    
+    rows = []
     for machine_id in machine_ids:
-        for i in range(30):
-            date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            existing = await db.production_data.find_one({"machine_id": machine_id, "date": date})
-            if not existing:
+        for date in dates:
+            if (machine_id, date) not in existing:
                 # Simulate realistic production data
-                base_output = random.uniform(800, 1200)
-                base_downtime = random.uniform(10, 60)
-                base_efficiency = random.uniform(75, 95)
-                quality_rate = random.uniform(0.92, 0.99)
-                
-                oee_data = calculate_oee(base_output, base_downtime, base_efficiency, quality_rate)
-                
                 production = ProductionDataCreate(
                     machine_id=machine_id,
                     date=date,
-                    output=base_output,
-                    downtime=base_downtime,
-                    efficiency=base_efficiency,
-                    quality_rate=quality_rate
+                    output=random.uniform(800, 1200),
+                    downtime=random.uniform(10, 60),
+                    efficiency=random.uniform(75, 95),
+                    quality_rate=random.uniform(0.92, 0.99)
                 )
-                
-                production_dict = production.dict()
-                production_dict.update(oee_data)
-                production_dict['id'] = str(uuid.uuid4())
-                production_dict['created_at'] = datetime.now(timezone.utc)
-                
-                await db.production_data.insert_one(production_dict)
+                rows.append(production.dict())
+    
+    await insert_production_records(rows)
 
 # Authentication Routes
 @api_router.post("/auth/register", response_model=User)
@@ -275,15 +575,90 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Machine Routes
-@api_router.get("/machines", response_model=List[Machine])
-async def get_machines(current_user: User = Depends(get_current_user)):
-    machines = await db.machines.find().to_list(1000)
-    return [Machine(**machine) for machine in machines]
+def encode_machine_cursor(machine: dict) -> str:
+    key = json.dumps([machine['name_lower'], machine['id']]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+def decode_machine_cursor(cursor: str) -> List[str]:
+    try:
+        name_lower, machine_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return [str(name_lower), str(machine_id)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/machines", response_model=List[MachineSummary])
+async def get_machines(
+    site: Optional[str] = None,
+    machine_type: Optional[str] = Query(None, alias="type"),
+    status: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MACHINES_PAGE_MAX),
+    cursor: Optional[str] = None,
+    include_kpis: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """List machines ordered by name, with filters, prefix search and keyset pagination
+
+    Without ``limit`` the whole (filtered) fleet is returned. With it, the response
+    carries an ``X-Next-Cursor`` header while more machines follow.
+    """
+    query: Dict[str, Any] = {}
+    for field, value in (("site", site), ("type", machine_type), ("status", status)):
+        if value is not None:
+            query[field] = value
+    if q:
+        # Anchored prefix on the lowercased name, served by the (name_lower, id) index
+        query["name_lower"] = {"$regex": "^" + re.escape(q.lower())}
+    if cursor:
+        name_lower, machine_id = decode_machine_cursor(cursor)
+        query["$or"] = [
+            {"name_lower": {"$gt": name_lower}},
+            {"name_lower": name_lower, "id": {"$gt": machine_id}}
+        ]
+    
+    # One extra row tells whether another page follows
+    fetch = limit + 1 if limit else None
+    pipeline: List[dict] = [{"$match": query}, {"$sort": {"name_lower": 1, "id": 1}}]
+    if fetch:
+        pipeline.append({"$limit": fetch})
+    if include_kpis:
+        # Latest production record of each machine on the page, in the same aggregation
+        pipeline.append({"$lookup": {
+            "from": "production_data",
+            "let": {"machine_id": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$machine_id", "$$machine_id"]}}},
+                {"$sort": {"date": -1, "created_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "date": 1, **{field: 1 for field in LATEST_KPI_FIELDS}}}
+            ],
+            "as": "latest_kpis"
+        }})
+        pipeline.append({"$set": {"latest_kpis": {"$first": "$latest_kpis"}}})
+    projection = model_projection(MachineSummary if include_kpis else Machine)
+    pipeline.append({"$project": dict(projection, name_lower=1)})
+    
+    source = analytics_db if include_kpis else db
+    machines = await source.machines.aggregate(pipeline).to_list(fetch)
+    
+    next_cursor = None
+    if limit and len(machines) > limit:
+        machines = machines[:limit]
+        next_cursor = encode_machine_cursor(machines[-1])
+    for machine in machines:
+        machine.pop('name_lower', None)
+    
+    response = db_rows_response(MachineSummary if include_kpis else Machine, machines)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @api_router.post("/machines", response_model=Machine)
 async def create_machine(machine_data: MachineCreate, current_user: User = Depends(get_current_user)):
     machine = Machine(**machine_data.dict())
-    await db.machines.insert_one(machine.dict())
+    await db.machines.insert_one(machine_document(machine))
+    await write_versions.touch("machines", machine_ids=[machine.id])
+    planned_time_cache[machine.id] = machine.planned_production_time
     return machine
 
 @api_router.get("/machines/{machine_id}", response_model=Machine)
@@ -298,6 +673,7 @@ async def get_machine(machine_id: str, current_user: User = Depends(get_current_
 async def get_production_data(
     machine_id: Optional[str] = None, 
     days: int = 30, 
+    include_archive: bool = False,
     current_user: User = Depends(get_current_user)
 ):
     query = {}
@@ -308,28 +684,56 @@ async def get_production_data(
     start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
     query["date"] = {"$gte": start_date}
     
-    production_data = await db.production_data.find(query).to_list(1000)
-    return [ProductionData(**data) for data in production_data]
+    production_data = await db.production_data.find(query, model_projection(ProductionData)).to_list(1000)
+    
+    # Months moved out of MongoDB are read back from the Parquet archive
+    if include_archive and len(production_data) < 1000:
+        archived = await asyncio.to_thread(
+            retention.read_archive, ARCHIVE_DIR, start_date, None, machine_id, 1000 - len(production_data)
+        )
+        production_data = archived + production_data
+    return db_rows_response(ProductionData, production_data)
 
-@api_router.post("/production", response_model=ProductionData)
+@api_router.post("/production", response_model=ProductionData, dependencies=[Depends(admit('production'))])
 async def create_production_data(
     data: ProductionDataCreate, 
     current_user: User = Depends(get_current_user)
 ):
-    # Calculate OEE
-    oee_data = calculate_oee(data.output, data.downtime, data.efficiency, data.quality_rate)
-    
-    production_dict = data.dict()
-    production_dict.update(oee_data)
-    production_dict['id'] = str(uuid.uuid4())
-    production_dict['created_at'] = datetime.now(timezone.utc)
+    # Calculate OEE against the machine's planned production time and store
+    records = await insert_production_records([data.dict()])
+    return ProductionData(**records[0])
+
+@api_router.post("/production/batch", dependencies=[Depends(admit('production_batch'))])
+async def create_production_data_batch(
+    # Checked while the list is validated: an oversized batch is refused (413) without validating its records
+    records: List[ProductionDataCreate] = Body(..., max_length=PRODUCTION_BATCH_MAX),
+    skip_existing: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Validate and insert many production records in one request (edge gateways)"""
+    rows = [record.dict() for record in records]
+    skipped = 0
+    if skip_existing:
+        existing = await find_existing_production_keys(rows)
+        seen = set()
+        fresh = []
+        for row in rows:
+            key = (row['machine_id'], row['date'])
+            if key not in existing and key not in seen:
+                seen.add(key)
+                fresh.append(row)
+        skipped = len(rows) - len(fresh)
+        rows = fresh
     
-    production = ProductionData(**production_dict)
-    await db.production_data.insert_one(production.dict())
-    return production
+    inserted = await insert_production_records(rows)
+    return {
+        "message": f"Successfully inserted {len(inserted)} records",
+        "inserted": len(inserted),
+        "skipped": skipped
+    }
 
 # CSV Upload Route
-@api_router.post("/upload-csv")
+@api_router.post("/upload-csv", dependencies=[Depends(admit('upload_csv'))])
 async def upload_csv(
     file: UploadFile = File(...), 
     current_user: User = Depends(get_current_user)
@@ -338,6 +742,8 @@ async def upload_csv(
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
+        import pandas as pd
+        
         contents = await file.read()
         df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
         
@@ -347,104 +753,222 @@ async def upload_csv(
         if missing_columns:
             raise HTTPException(status_code=400, detail=f"Missing columns: {missing_columns}")
         
-        uploaded_count = 0
-        for _, row in df.iterrows():
-            # Calculate OEE
-            quality_rate = row.get('quality_rate', 1.0)
-            oee_data = calculate_oee(row['output'], row['downtime'], row['efficiency'], quality_rate)
-            
-            production_dict = {
-                'id': str(uuid.uuid4()),
-                'machine_id': str(row['machine_id']),
-                'date': str(row['date']),
-                'output': float(row['output']),
-                'downtime': float(row['downtime']),
-                'efficiency': float(row['efficiency']),
-                'quality_rate': quality_rate,
-                'created_at': datetime.now(timezone.utc)
-            }
-            production_dict.update(oee_data)
-            
-            # Check if data already exists
-            existing = await db.production_data.find_one({
-                "machine_id": production_dict['machine_id'],
-                "date": production_dict['date']
-            })
-            
-            if not existing:
-                await db.production_data.insert_one(production_dict)
-                uploaded_count += 1
+        # Normalise columns once instead of per row
+        rows_df = pd.DataFrame({
+            'machine_id': df['machine_id'].astype(str),
+            'date': df['date'].astype(str),
+            'output': pd.to_numeric(df['output']).astype(float),
+            'downtime': pd.to_numeric(df['downtime']).astype(float),
+            'efficiency': pd.to_numeric(df['efficiency']).astype(float),
+            'quality_rate': (
+                pd.to_numeric(df['quality_rate']).fillna(1.0).astype(float)
+                if 'quality_rate' in df.columns else 1.0
+            )
+        })
+        invalid_dates = rows_df.index[~rows_df['date'].map(is_iso_day)]
+        if len(invalid_dates):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid dates (expected YYYY-MM-DD) in rows: {[int(i) + 2 for i in invalid_dates[:10]]}"
+            )
+        
+        # Keep the first row per (machine, date), as the previous row-by-row insert did
+        rows_df = rows_df.drop_duplicates(subset=['machine_id', 'date'], keep='first')
+        rows = [
+            dict(zip(rows_df.columns, values))
+            for values in zip(*(rows_df[column].tolist() for column in rows_df.columns))
+        ]
         
-        return {"message": f"Successfully uploaded {uploaded_count} records", "total_rows": len(df)}
+        # Check which records already exist in a single query
+        existing = await find_existing_production_keys(rows)
+        rows = [row for row in rows if (row['machine_id'], row['date']) not in existing]
+        
+        uploaded = await insert_production_records(rows)
+        return {"message": f"Successfully uploaded {len(uploaded)} records", "total_rows": len(df)}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
 
 # ML Prediction Routes
+async def load_training_data():
+    """Training rows from the feature store, with their feature matrix and targets"""
+    # Built once for databases that predate the feature store. The check, and the read
+    # right after a rebuild, go to the primary: a lagging secondary may not have the rows yet
+    source = analytics_db
+    if await db.production_features.estimated_document_count() == 0:
+        await feature_store.rebuild(analytics_db, db)
+        source = db
+    features = list(FEATURE_COLUMNS)
+    projection = {'_id': 0, 'machine_id': 1, **{column: 1 for column in features + list(TARGETS)}}
+    rows = await source.production_features.find(
+        {"feature_set": FEATURE_SET}, projection
+    ).sort("date", -1).limit(TRAINING_MAX_ROWS).to_list(TRAINING_MAX_ROWS)
+    
+    if len(rows) < 10:
+        raise HTTPException(status_code=400, detail="Not enough data to train model. Need at least 10 records.")
+    
+    X = feature_matrix(rows, features)
+    targets = {target: feature_matrix(rows, [target]).ravel() for target in TARGETS}
+    return rows, features, X, targets
+
 @api_router.post("/ml/train")
-async def train_model(current_user: User = Depends(get_current_user)):
+async def train_model(
+    partition_by: Optional[str] = None,
+    tuning_job_id: Optional[str] = None,
+    min_r2: Optional[float] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Train the global model plus one model per machine type or site, in parallel
+
+    With ``tuning_job_id`` the forests use that search's parameters: the lowest-latency
+    configuration reaching ``min_r2``, or the most accurate one.
+    """
+    partition_by = partition_by or TRAINING_PARTITION_BY
+    if partition_by not in training.PARTITION_KEYS:
+        raise HTTPException(status_code=400, detail=f"partition_by must be one of {', '.join(training.PARTITION_KEYS)}")
+    
+    params = None
+    if tuning_job_id:
+        job = await db.ml_jobs.find_one({"id": tuning_job_id, "type": "tuning"})
+        if job is None or job['status'] != 'completed':
+            raise HTTPException(status_code=400, detail="Tuning job not found or not completed")
+        params = tuning.select_params(job['result'], min_r2)
+    
     try:
-        # Get production data for training
-        production_data = await db.production_data.find().to_list(1000)
-        
-        if len(production_data) < 10:
-            raise HTTPException(status_code=400, detail="Not enough data to train model. Need at least 10 records.")
-        
-        # Prepare data for training
-        df = pd.DataFrame(production_data)
-        
-        # Feature engineering
-        df['date'] = pd.to_datetime(df['date'])
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
-        
-        # Features and target
-        features = ['output', 'downtime', 'day_of_week', 'month']
-        X = df[features]
-        y_efficiency = df['efficiency']
-        y_oee = df['oee']
-        
-        # Train efficiency model
-        X_train, X_test, y_efficiency_train, y_efficiency_test = train_test_split(X, y_efficiency, test_size=0.2, random_state=42)
+        await warm_ml_imports()
+        rows, features, X, targets = await load_training_data()
         
-        efficiency_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        efficiency_model.fit(X_train, y_efficiency_train)
-        
-        # Train OEE model with same split
-        _, _, y_oee_train, y_oee_test = train_test_split(X, y_oee, test_size=0.2, random_state=42)
-        oee_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        oee_model.fit(X_train, y_oee_train)
-        
-        # Calculate metrics
-        efficiency_pred = efficiency_model.predict(X_test)
-        efficiency_r2 = r2_score(y_efficiency_test, efficiency_pred)
-        efficiency_mse = mean_squared_error(y_efficiency_test, efficiency_pred)
-        
-        oee_pred = oee_model.predict(X_test)
-        oee_r2 = r2_score(y_oee_test, oee_pred)
-        
-        # Save models
-        model_path_efficiency = model_dir / "efficiency_model.joblib"
-        model_path_oee = model_dir / "oee_model.joblib"
+        # Rows of each partition
+        machines = {
+            machine['id']: machine
+            for machine in await db.machines.find({}, {'_id': 0, 'id': 1, 'type': 1, 'site': 1}).to_list(None)
+        }
+        partitions = training.partition_rows([row['machine_id'] for row in rows], machines, partition_by)
         
-        joblib.dump(efficiency_model, model_path_efficiency)
-        joblib.dump(oee_model, model_path_oee)
+        # Partitions are fitted in a process pool off the event loop
+        results = await asyncio.to_thread(
+            training.train_partitions, X, targets, partitions, params, TRAINING_WORKERS
+        )
+        models, metadata = training.registry_bundle(results, partition_by)
         
-        # Store in memory for quick access
-        ml_models['efficiency'] = efficiency_model
-        ml_models['oee'] = oee_model
+        # Register a new model version; it is served from memory here and other workers pick it up
+        version = model_registry.save(models, dict(
+            metadata, features=features, feature_set=FEATURE_SET, params=params, tuning_job_id=tuning_job_id
+        ))
         
         return {
             "message": "Model trained successfully",
-            "efficiency_r2_score": efficiency_r2,
-            "efficiency_mse": efficiency_mse,
-            "oee_r2_score": oee_r2,
-            "training_samples": len(df)
+            "model_version": version,
+            "feature_set": FEATURE_SET,
+            "efficiency_r2_score": metadata['efficiency_r2_score'],
+            "efficiency_mse": metadata['efficiency_mse'],
+            "oee_r2_score": metadata['oee_r2_score'],
+            "training_samples": len(rows),
+            "partition_by": partition_by,
+            "params": params,
+            "partitions": {
+                value: {key: metric for key, metric in partition.items() if key != 'models'}
+                for value, partition in metadata['partitions'].items()
+            }
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error training model: {str(e)}")
 
+async def job_heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await db.ml_jobs.update_one({"id": job_id}, {"$set": {"heartbeat_at": datetime.now(timezone.utc)}})
+        except Exception as e:
+            logger.warning(f"Could not record the heartbeat of job {job_id}: {str(e)}")
+
+async def run_tuning_job(job: MLJob):
+    """Run a hyperparameter search off the event loop and record its outcome on the job"""
+    heartbeat = None
+    try:
+        now = datetime.now(timezone.utc)
+        await db.ml_jobs.update_one(
+            {"id": job.id},
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "worker": WORKER_ID}}
+        )
+        heartbeat = asyncio.create_task(job_heartbeat(job.id))
+        await warm_ml_imports()
+        _, _, X, targets = await load_training_data()
+        result = await asyncio.to_thread(tuning.tune, X, targets, **job.params)
+        update = {"status": "completed", "result": result}
+    except asyncio.CancelledError:
+        # Shutdown cancels the task; record it so the job does not stay "running"
+        await db.ml_jobs.update_one({"id": job.id}, {"$set": {
+            "status": "failed", "error": "Cancelled: the worker shut down", "finished_at": datetime.now(timezone.utc)
+        }})
+        raise
+    except HTTPException as e:
+        update = {"status": "failed", "error": e.detail}
+    except Exception as e:
+        logger.exception("Tuning job %s failed", job.id)
+        update = {"status": "failed", "error": str(e)}
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        tuning_tasks.pop(job.id, None)
+    update["finished_at"] = datetime.now(timezone.utc)
+    await db.ml_jobs.update_one({"id": job.id}, {"$set": update})
+
+async def fail_interrupted_jobs():
+    """Mark jobs whose worker stopped before recording an outcome as failed"""
+    query = {"status": {"$in": ["queued", "running"]}}
+    if MULTI_WORKER:
+        # Other workers' jobs are live while their heartbeat is
+        stale = datetime.now(timezone.utc) - timedelta(seconds=3 * JOB_HEARTBEAT_SECONDS)
+        query["$or"] = [
+            {"heartbeat_at": {"$lt": stale}},
+            {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": stale}}
+        ]
+    result = await db.ml_jobs.update_many(query, {"$set": {
+        "status": "failed", "error": "Interrupted: the worker running the job stopped",
+        "finished_at": datetime.now(timezone.utc)
+    }})
+    if result.modified_count:
+        logger.info(f"Marked {result.modified_count} interrupted jobs as failed")
+
+@api_router.post("/ml/tune", response_model=MLJob, status_code=202)
+async def start_tuning(
+    n_candidates: int = Query(32, ge=2, le=512),
+    cv_folds: int = Query(5, ge=2, le=10),
+    max_estimators: int = Query(400, ge=10, le=2000),
+    current_user: User = Depends(get_current_user)
+):
+    """Start a successive-halving hyperparameter search as a background job"""
+    if tuning_tasks:
+        raise HTTPException(status_code=409, detail="A tuning job is already running")
+    
+    job = MLJob(
+        type="tuning",
+        params={
+            'n_candidates': n_candidates,
+            'cv_folds': cv_folds,
+            'min_estimators': min(25, max_estimators),
+            'max_estimators': max_estimators
+        },
+        created_by=current_user.username
+    )
+    await db.ml_jobs.insert_one(job.dict())
+    tuning_tasks[job.id] = asyncio.create_task(run_tuning_job(job))
+    return job
+
+@api_router.get("/ml/jobs/{job_id}", response_model=MLJob)
+async def get_ml_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Status of a background ML job; completed tuning jobs carry the accuracy/latency frontier"""
+    job = await db.ml_jobs.find_one({"id": job_id}, model_projection(MLJob))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @api_router.post("/ml/predict/{machine_id}")
 async def predict_performance(
     machine_id: str, 
@@ -453,75 +977,132 @@ async def predict_performance(
 ):
     try:
         # Load models if not in memory
-        if 'efficiency' not in ml_models:
-            model_path_efficiency = model_dir / "efficiency_model.joblib"
-            model_path_oee = model_dir / "oee_model.joblib"
-            
-            if model_path_efficiency.exists() and model_path_oee.exists():
-                ml_models['efficiency'] = joblib.load(model_path_efficiency)
-                ml_models['oee'] = joblib.load(model_path_oee)
-            else:
-                raise HTTPException(status_code=400, detail="No trained model found. Train a model first.")
-        
-        # Get recent data for the machine
-        recent_data = await db.production_data.find(
-            {"machine_id": machine_id}
-        ).sort("date", -1).limit(5).to_list(5)
-        
-        if not recent_data:
+        if not await ensure_models_loaded():
+            raise HTTPException(status_code=400, detail="No trained model found. Train a model first.")
+        
+        # Latest precomputed features of the machine, the same ones the model was trained on
+        snapshot = await feature_store.snapshot(db, machine_id)
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No production data found for this machine")
         
-        predictions = []
+        # Unchanged inputs return the stored forecast; new data or a retrain change the key
+        issued_on = datetime.now().strftime("%Y-%m-%d")
+        watermark = snapshot['watermark']
+        cache_key = (machine_id, days_ahead, model_registry.version, watermark, issued_on)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Generate predictions for the next N days
-        for i in range(1, days_ahead + 1):
-            future_date = (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d")
-            future_datetime = datetime.now() + timedelta(days=i)
-            
-            # Use average of recent data as baseline
-            avg_output = np.mean([d['output'] for d in recent_data])
-            avg_downtime = np.mean([d['downtime'] for d in recent_data])
-            
-            # Feature vector
-            features = [
-                avg_output,
-                avg_downtime,
-                future_datetime.weekday(),
-                future_datetime.month
-            ]
-            
-            # Make predictions
-            efficiency_pred = ml_models['efficiency'].predict([features])[0]
-            oee_pred = ml_models['oee'].predict([features])[0]
-            
+        future_datetimes = [datetime.now() + timedelta(days=i) for i in range(1, days_ahead + 1)]
+        target_dates = [future_datetime.strftime("%Y-%m-%d") for future_datetime in future_datetimes]
+        stored = await db.predictions.find(
+            {
+                "machine_id": machine_id,
+                "date": {"$in": target_dates},
+                "model_version": model_registry.version,
+                "watermark": watermark,
+                "issued_on": issued_on
+            },
+            model_projection(Prediction)
+        ).sort("date", 1).to_list(days_ahead)
+        if days_ahead > 0 and len(stored) == days_ahead:
+            prediction_cache.put(cache_key, stored)
+            return stored
+        
+        # Feature matrix for the next N days, predicted in a single call per model
+        rows = feature_store.inference_rows(snapshot, target_dates)
+        features = feature_matrix(rows, model_registry.metadata.get('features', LEGACY_FEATURES))
+        
+        # Route to the model of the machine's type/site partition, or the global one
+        machine = await db.machines.find_one({"id": machine_id}, {'_id': 0, 'type': 1, 'site': 1})
+        _, model_names = training.route(model_registry.metadata, machine)
+        efficiency_preds = ml_models[model_names['efficiency']].predict(features) if days_ahead > 0 else []
+        oee_preds = ml_models[model_names['oee']].predict(features) if days_ahead > 0 else []
+        
+        predictions = []
+        for i, target_date in enumerate(target_dates, start=1):
             # Calculate confidence (simplified)
             confidence = min(0.95, max(0.5, 1.0 - (i * 0.05)))  # Decreasing confidence over time
             
             prediction = Prediction(
                 machine_id=machine_id,
-                date=future_date,
-                predicted_efficiency=round(efficiency_pred, 2),
-                predicted_oee=round(oee_pred, 2),
-                confidence=round(confidence, 2)
+                date=target_date,
+                predicted_efficiency=round(efficiency_preds[i - 1], 2),
+                predicted_oee=round(oee_preds[i - 1], 2),
+                confidence=round(confidence, 2),
+                model_version=model_registry.version,
+                watermark=watermark,
+                issued_on=issued_on
             )
-            
-            # Store prediction
-            await db.predictions.insert_one(prediction.dict())
-            predictions.append(prediction)
+            predictions.append(prediction.dict())
+        
+        # Store predictions, replacing earlier forecasts of the same machine and day
+        if predictions:
+            replacements = [
+                ReplaceOne({"machine_id": machine_id, "date": prediction['date']}, prediction, upsert=True)
+                for prediction in predictions
+            ]
+            try:
+                await db.predictions.bulk_write(replacements, ordered=False)
+            except BulkWriteError:
+                # A concurrent forecast inserted the same day first; replace it instead
+                await db.predictions.bulk_write(replacements, ordered=False)
+            await write_versions.touch("predictions", machine_ids=[machine_id])
         
+        prediction_cache.put(cache_key, predictions)
         return predictions
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error making predictions: {str(e)}")
 
+@api_router.get("/ml/features/{machine_id}")
+async def get_machine_features(machine_id: str, current_user: User = Depends(get_current_user)):
+    """Latest rolling-window features of a machine"""
+    snapshot = await feature_store.snapshot(db, machine_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No features found for this machine")
+    return snapshot
+
+@api_router.post("/ml/features/rebuild")
+async def rebuild_features(current_user: User = Depends(get_current_user)):
+    """Recompute every training row and machine snapshot from the production history"""
+    rows = await feature_store.rebuild(analytics_db, db)
+    return {"message": "Feature store rebuilt", "feature_set": FEATURE_SET, "rows": rows}
+
 @api_router.get("/predictions/{machine_id}", response_model=List[Prediction])
-async def get_predictions(machine_id: str, current_user: User = Depends(get_current_user)):
-    predictions = await db.predictions.find({"machine_id": machine_id}).sort("date", 1).to_list(100)
-    return [Prediction(**pred) for pred in predictions]
+async def get_predictions(machine_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    # The TTL index deletes forecasts without a write version. Hide every forecast that may
+    # expire before the next midnight, so the body changes only on writes and at midnight
+    horizon = local_midnight() + timedelta(days=1 - PREDICTION_TTL_DAYS)
+    headers, not_modified = await conditional_get(
+        request, "predictions", versions.machine_keys("predictions", machine_id),
+        machine_id=machine_id, expires_before=horizon.isoformat()
+    )
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    predictions = await db.predictions.find(
+        {"machine_id": machine_id, "created_at": {"$gte": horizon}}, model_projection(Prediction)
+    ).sort("date", 1).to_list(100)
+    response = db_rows_response(Prediction, predictions)
+    response.headers.update(headers)
+    return response
 
 # Dashboard Routes
 @api_router.get("/dashboard", response_model=DashboardKPIs)
-async def get_dashboard_kpis(current_user: User = Depends(get_current_user)):
+async def get_dashboard_kpis(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    # Served from the hot store, the production part of the version is what this worker holds
+    keys = ["machines", "maintenance_logs", "machine_reliability", "alerts"]
+    if hot_store.covers(7):
+        headers, not_modified = await conditional_get(request, "dashboard", keys, hot_store.last_modified())
+    else:
+        headers, not_modified = await conditional_get(request, "dashboard", keys + ["production_data"])
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
     try:
         # Get all machines
         machines_count = await db.machines.count_documents({})
@@ -529,11 +1110,26 @@ async def get_dashboard_kpis(current_user: User = Depends(get_current_user)):
         # Get recent production data (last 7 days)
         start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
         
-        recent_production = await db.production_data.find(
-            {"date": {"$gte": start_date}}
-        ).to_list(1000)
+        if hot_store.covers(7):
+            summary = hot_store.summary(start_date)
+        else:
+            # The validators are written after the primary write, so read the body from the
+            # primary too: a lagging secondary would pair an old body with the new ETag
+            recent_production = await db.production_data.find(
+                {"date": {"$gte": start_date}}
+            ).to_list(1000)
+            summary = {'records': len(recent_production)}
+            if recent_production:
+                import pandas as pd
+                df = pd.DataFrame(recent_production)
+                summary.update({
+                    'average_oee': df['oee'].mean(),
+                    'total_downtime': df['downtime'].sum(),
+                    'average_efficiency': df['efficiency'].mean(),
+                    'production_output': df['output'].sum(),
+                })
         
-        if not recent_production:
+        if not summary['records']:
             # Return default values if no data
             return DashboardKPIs(
                 total_machines=machines_count,
@@ -545,27 +1141,18 @@ async def get_dashboard_kpis(current_user: User = Depends(get_current_user)):
                 maintenance_alerts=0
             )
         
-        # Calculate KPIs
-        df = pd.DataFrame(recent_production)
+        # Fleet MTBF from the maintenance analytics counters
+        mtbf = (await get_fleet_reliability())['mtbf_hours']
         
-        avg_oee = df['oee'].mean()
-        total_downtime = df['downtime'].sum()
-        avg_efficiency = df['efficiency'].mean()
-        total_output = df['output'].sum()
-        
-        # MTBF calculation (simplified)
-        total_operating_time = len(recent_production) * 24  # hours
-        mtbf = total_operating_time / max(1, len(recent_production))
-        
-        # Maintenance alerts (machines with high downtime)
-        maintenance_alerts = len(df[df['downtime'] > 50])
+        # Maintenance alerts raised by the anomaly detector and not yet acknowledged
+        maintenance_alerts = await db.alerts.count_documents({"acknowledged": False})
         
         return DashboardKPIs(
             total_machines=machines_count,
-            average_oee=round(avg_oee, 2),
-            total_downtime=round(total_downtime, 2),
-            average_efficiency=round(avg_efficiency, 2),
-            production_output=round(total_output, 2),
+            average_oee=round(summary['average_oee'], 2),
+            total_downtime=round(summary['total_downtime'], 2),
+            average_efficiency=round(summary['average_efficiency'], 2),
+            production_output=round(summary['production_output'], 2),
             mtbf=round(mtbf, 2),
             maintenance_alerts=maintenance_alerts
         )
@@ -573,12 +1160,40 @@ async def get_dashboard_kpis(current_user: User = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating KPIs: {str(e)}")
 
+@api_router.get("/analytics/monthly")
+async def get_monthly_rollups(
+    machine_id: Optional[str] = None,
+    months: int = 12,
+    current_user: User = Depends(get_current_user)
+):
+    """Monthly production summaries of archived data"""
+    today = datetime.now()
+    start = today.year * 12 + today.month - 1 - months
+    query = {"month": {"$gte": f"{start // 12:04d}-{start % 12 + 1:02d}"}}
+    if machine_id:
+        query["machine_id"] = machine_id
+    
+    rollups = await analytics_db.production_monthly.find(query, {'_id': 0}).sort("month", 1).to_list(None)
+    return rollups
+
 @api_router.get("/analytics/trends")
 async def get_trends(
+    request: Request,
+    response: Response,
     machine_id: Optional[str] = None, 
     days: int = 30, 
     current_user: User = Depends(get_current_user)
 ):
+    params = {"machine_id": machine_id, "days": days}
+    if hot_store.covers(days):
+        headers, not_modified = await conditional_get(request, "trends", [], hot_store.last_modified(machine_id), **params)
+    else:
+        keys = versions.machine_keys("production_data", machine_id)
+        headers, not_modified = await conditional_get(request, "trends", keys, **params)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
     try:
         query = {}
         if machine_id:
@@ -586,13 +1201,29 @@ async def get_trends(
         
         start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
         query["date"] = {"$gte": start_date}
+        date_range = f"{start_date} to {datetime.now().strftime('%Y-%m-%d')}"
         
+        if hot_store.covers(days):
+            trends = hot_store.daily_trends(start_date, machine_id)
+            if not trends['records']:
+                return {"data": [], "message": "No data available"}
+            return {
+                "data": trends['data'],
+                "summary": {
+                    "total_records": trends['records'],
+                    "date_range": date_range,
+                    "machines_count": trends['machines']
+                }
+            }
+        
+        # From the primary, like the validators above (see get_dashboard_kpis)
         production_data = await db.production_data.find(query).sort("date", 1).to_list(1000)
         
         if not production_data:
             return {"data": [], "message": "No data available"}
         
         # Process data for trends
+        import pandas as pd
         df = pd.DataFrame(production_data)
         
         # Group by date and calculate averages
@@ -609,7 +1240,7 @@ async def get_trends(
             "data": trends_data,
             "summary": {
                 "total_records": len(production_data),
-                "date_range": f"{start_date} to {datetime.now().strftime('%Y-%m-%d')}",
+                "date_range": date_range,
                 "machines_count": len(df['machine_id'].unique())
             }
         }
@@ -617,11 +1248,80 @@ async def get_trends(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting trends: {str(e)}")
 
+async def get_fleet_reliability() -> dict:
+    counters = await db.machine_reliability.find({}, {"_id": 0}).to_list(None)
+    planned = await get_planned_production_times(row['machine_id'] for row in counters)
+    return reliability.fleet_summary(counters, planned, DEFAULT_PLANNED_PRODUCTION_TIME)
+
+@api_router.get("/analytics/reliability")
+async def get_reliability(
+    machine_id: Optional[str] = None,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user)
+):
+    """Per-machine MTBF, MTTR and failure rates, worst failure rate first, plus a fleet summary"""
+    query = {"machine_id": machine_id} if machine_id else {}
+    counters = await db.machine_reliability.find(query, {"_id": 0}).to_list(None)
+    planned = await get_planned_production_times(row['machine_id'] for row in counters)
+    
+    machines = [
+        reliability.derive_metrics(row, planned[row['machine_id']])
+        for row in counters
+    ]
+    machines.sort(key=lambda row: (-row['failure_rate_per_1000h'], row['machine_id']))
+    return {
+        "fleet": reliability.fleet_summary(counters, planned, DEFAULT_PLANNED_PRODUCTION_TIME),
+        "machines": machines[:max(0, limit)]
+    }
+
+@api_router.post("/analytics/reliability/rebuild")
+async def rebuild_reliability(current_user: User = Depends(get_current_user)):
+    """Recompute the reliability counters from maintenance_logs and production_data"""
+    machines = await rebuild_reliability_counters()
+    if machines is None:
+        raise HTTPException(status_code=409, detail="A reliability rebuild is already in progress")
+    return {"message": f"Rebuilt reliability counters for {machines} machines"}
+
+# Alert Routes
+@api_router.get("/alerts", response_model=List[Alert])
+async def get_alerts(
+    machine_id: Optional[str] = None,
+    acknowledged: Optional[bool] = False,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user)
+):
+    """Anomaly alerts, newest first (open ones by default; acknowledged=null for all)"""
+    query = {}
+    if machine_id:
+        query["machine_id"] = machine_id
+    if acknowledged is not None:
+        query["acknowledged"] = acknowledged
+    
+    alerts = await db.alerts.find(query, model_projection(Alert)).sort("created_at", -1).to_list(max(0, min(limit, 1000)))
+    return db_rows_response(Alert, alerts)
+
+@api_router.post("/alerts/{alert_id}/acknowledge", response_model=Alert)
+async def acknowledge_alert(alert_id: str, current_user: User = Depends(get_current_user)):
+    alert = await db.alerts.find_one_and_update(
+        {"id": alert_id},
+        {"$set": {
+            "acknowledged": True,
+            "acknowledged_by": current_user.username,
+            "acknowledged_at": datetime.now(timezone.utc)
+        }},
+        projection=model_projection(Alert),
+        return_document=ReturnDocument.AFTER
+    )
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    await write_versions.touch("alerts", machine_ids=[alert['machine_id']])
+    return Alert(**alert)
+
 # Maintenance Routes
 @api_router.get("/maintenance", response_model=List[MaintenanceLog])
 async def get_maintenance_logs(current_user: User = Depends(get_current_user)):
-    logs = await db.maintenance_logs.find().sort("date", -1).to_list(100)
-    return [MaintenanceLog(**log) for log in logs]
+    logs = await db.maintenance_logs.find({}, model_projection(MaintenanceLog)).sort("date", -1).to_list(100)
+    return db_rows_response(MaintenanceLog, logs)
 
 @api_router.post("/maintenance", response_model=MaintenanceLog)
 async def create_maintenance_log(
@@ -630,56 +1330,63 @@ async def create_maintenance_log(
 ):
     log = MaintenanceLog(**log_data.dict())
     await db.maintenance_logs.insert_one(log.dict())
+    await reliability.record_maintenance(db.machine_reliability, log.dict())
+    await feature_store.record_maintenance(db, log.dict())
+    await write_versions.touch("maintenance_logs", "machine_reliability", machine_ids=[log.machine_id])
     return log
 
 # Real-time Data Simulation
-@api_router.post("/simulate-data")
+async def simulate_machines(machine_ids: List[str], today: str) -> int:
+    """Insert one simulated record per machine that has no data for ``today`` yet"""
+    # Check which machines already have data for today
+    existing = await find_existing_production_keys(
+        [{'machine_id': machine_id, 'date': today} for machine_id in machine_ids]
+    )
+    
+    rows = []
+    for machine_id in machine_ids:
+        if (machine_id, today) not in existing:
+            # Generate realistic data
+            rows.append({
+                'machine_id': machine_id,
+                'date': today,
+                'output': random.uniform(800, 1200),
+                'downtime': random.uniform(5, 45),
+                'efficiency': random.uniform(80, 95),
+                'quality_rate': random.uniform(0.92, 0.99)
+            })
+    return len(await insert_production_records(rows))
+
+@api_router.post("/simulate-data", dependencies=[Depends(admit('simulate'))])
 async def simulate_real_time_data(current_user: User = Depends(get_current_user)):
     """Generate real-time simulation data"""
     try:
-        machines = await db.machines.find().to_list(1000)
-        if not machines:
-            raise HTTPException(status_code=400, detail="No machines found. Create machines first.")
-        
         today = datetime.now().strftime("%Y-%m-%d")
-        simulated_count = 0
         
-        for machine in machines:
-            # Check if data already exists for today
-            existing = await db.production_data.find_one({
-                "machine_id": machine["id"],
-                "date": today
-            })
-            
-            if not existing:
-                # Generate realistic data
-                base_output = random.uniform(800, 1200)
-                base_downtime = random.uniform(5, 45)
-                base_efficiency = random.uniform(80, 95)
-                quality_rate = random.uniform(0.92, 0.99)
-                
-                oee_data = calculate_oee(base_output, base_downtime, base_efficiency, quality_rate)
-                
-                production_dict = {
-                    'id': str(uuid.uuid4()),
-                    'machine_id': machine["id"],
-                    'date': today,
-                    'output': base_output,
-                    'downtime': base_downtime,
-                    'efficiency': base_efficiency,
-                    'quality_rate': quality_rate,
-                    'created_at': datetime.now(timezone.utc)
-                }
-                production_dict.update(oee_data)
-                
-                await db.production_data.insert_one(production_dict)
-                simulated_count += 1
+        # Walk the fleet with a cursor, one batch of machines at a time
+        seen = simulated = 0
+        batch: List[str] = []
+        machines = db.machines.find({}, {'_id': 0, 'id': 1}).batch_size(SIMULATE_BATCH_SIZE)
+        async for machine in machines:
+            batch.append(machine["id"])
+            if len(batch) == SIMULATE_BATCH_SIZE:
+                simulated += await simulate_machines(batch, today)
+                seen += len(batch)
+                batch = []
+        if batch:
+            simulated += await simulate_machines(batch, today)
+            seen += len(batch)
+        
+        if not seen:
+            raise HTTPException(status_code=400, detail="No machines found. Create machines first.")
         
         return {
-            "message": f"Generated real-time data for {simulated_count} machines",
+            "message": f"Generated real-time data for {simulated} machines",
             "date": today
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error simulating data: {str(e)}")
 
@@ -699,9 +1406,279 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
 
+@api_router.post("/admin/retention/run")
+async def run_retention_now(current_user: User = Depends(get_current_user)):
+    """Archive and roll up old production data now"""
+    summary = await run_retention()
+    if summary is None:
+        raise HTTPException(status_code=409, detail="A retention run is already in progress")
+    return summary
+
+@api_router.get("/metrics/admission")
+async def get_admission_metrics(current_user: User = Depends(get_current_user)):
+    """In-flight, queued and rejected ingestion requests per concurrency group"""
+    return admission.snapshot()
+
+@api_router.get("/metrics/db-pool")
+async def get_db_pool_metrics(current_user: User = Depends(get_current_user)):
+    """Connection pool saturation and checkout wait times per client and server"""
+    return {role: metrics.snapshot() for role, metrics in pool_metrics.items()}
+
+async def dedupe_predictions() -> int:
+    """Keep only the newest forecast of each machine and day. Returns the number deleted."""
+    pipeline = [
+        {"$sort": {"created_at": -1}},
+        {"$group": {"_id": {"machine_id": "$machine_id", "date": "$date"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    stale = []
+    async for group in db.predictions.aggregate(pipeline, allowDiskUse=True):
+        stale.extend(group["ids"][1:])
+    deleted = 0
+    for start in range(0, len(stale), INSERT_CHUNK_SIZE):
+        result = await db.predictions.delete_many({"_id": {"$in": stale[start:start + INSERT_CHUNK_SIZE]}})
+        deleted += result.deleted_count
+    return deleted
+
+async def ensure_unique_predictions():
+    """One forecast per machine and day: remove duplicates, then make the upsert key unique"""
+    indexes = await db.predictions.index_information()
+    existing = indexes.get("machine_id_1_date_1")
+    if existing is not None and existing.get("unique"):
+        return
+    for attempt in range(3):
+        deleted = await dedupe_predictions()
+        if deleted:
+            logger.info(f"Removed {deleted} duplicate predictions")
+        if existing is not None:
+            # The earlier non-unique index has the same name and key
+            await db.predictions.drop_index("machine_id_1_date_1")
+            existing = None
+        try:
+            await db.predictions.create_index([("machine_id", 1), ("date", 1)], unique=True)
+            return
+        except DuplicateKeyError:
+            # A forecast was inserted twice meanwhile; dedupe again
+            continue
+    raise RuntimeError("Could not make predictions unique per machine and day")
+
+async def ensure_indexes():
+    """Create the indexes the API's queries rely on (no-op when they exist)"""
+    await db.production_data.create_index([("machine_id", 1), ("date", 1)])
+    await db.production_data.create_index("date")
+    await db.production_data.create_index("created_at")
+    await ensure_unique_predictions()
+    await db.maintenance_logs.create_index([("machine_id", 1), ("date", 1)])
+    await db.maintenance_logs.create_index("created_at")
+    await db.machines.create_index("id")
+    await db.machines.create_index([("name_lower", 1), ("id", 1)])
+    await db.machines.create_index([("site", 1), ("type", 1), ("status", 1)])
+    await db.users.create_index("email")
+    await db.machine_reliability.create_index("machine_id", unique=True)
+    await db.production_days.create_index([("machine_id", 1), ("date", 1)], unique=True)
+    await db.alerts.create_index([("acknowledged", 1), ("created_at", -1)])
+    await db.alerts.create_index([("machine_id", 1), ("created_at", -1)])
+    await db.production_features.create_index("production_id", unique=True)
+    await db.production_features.create_index([("feature_set", 1), ("date", -1)])
+    await db.machine_features.create_index("machine_id", unique=True)
+    await db.ml_jobs.create_index("id")
+    await db.production_monthly.create_index([("machine_id", 1), ("month", 1)], unique=True)
+    await db.production_monthly.create_index("month")
+    await retention.ensure_prediction_ttl(db.predictions, PREDICTION_TTL_DAYS)
+
+async def backfill_machine_search_keys():
+    """Add the lowercased search key to machines created before it existed"""
+    try:
+        await db.machines.update_many(
+            {"name_lower": {"$exists": False}},
+            [{"$set": {"name_lower": {"$toLower": "$name"}}}]
+        )
+    except Exception as e:
+        logger.warning(f"Could not backfill machine search keys: {str(e)}")
+
+async def load_hot_store():
+    try:
+        await hot_store.load(db.production_data)
+        # Warm the anomaly detector from the same history
+        for machine_id in hot_store.machine_ids():
+            anomaly_detector.seed(machine_id, hot_store.series(machine_id))
+        await feature_store.load_maintenance(db.maintenance_logs)
+        feature_store.refresh_snapshots()
+    except Exception as e:
+        # Analytics endpoints fall back to MongoDB until the store is loaded
+        logger.warning(f"Could not load hot production store: {str(e)}")
+
+async def rebuild_reliability_counters() -> Optional[int]:
+    """Rebuild the counters from the primary unless another worker is rebuilding them"""
+    if not await retention.acquire_lease(db.locks, "reliability-rebuild", WORKER_ID, seconds=3600):
+        return None
+    try:
+        machines = await reliability.rebuild(db, db.machine_reliability)
+        await write_versions.touch("machine_reliability", machine_ids=None)
+        return machines
+    finally:
+        await retention.release_lease(db.locks, "reliability-rebuild", WORKER_ID)
+
+async def init_reliability():
+    """Build the reliability counters once for databases that predate them (or predate day counts)"""
+    try:
+        if await db.machine_reliability.estimated_document_count() == 0 or \
+                await db.machine_reliability.find_one({"production_days": {"$exists": False}}) is not None:
+            machines = await rebuild_reliability_counters()
+            if machines is not None:
+                logger.info(f"Built reliability counters for {machines} machines")
+    except Exception as e:
+        logger.warning(f"Could not build reliability counters: {str(e)}")
+
+async def init_feature_store():
+    """Materialise the training features once for databases that predate them"""
+    try:
+        if await db.production_features.estimated_document_count() == 0 and \
+                await db.production_data.estimated_document_count() > 0:
+            rows = await feature_store.rebuild(analytics_db, db)
+            logger.info(f"Built {rows} feature rows")
+    except Exception as e:
+        logger.warning(f"Could not build the feature store: {str(e)}")
+
+def import_ml_libraries():
+    import joblib  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+    import sklearn.model_selection  # noqa: F401
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+
+async def warm_ml_imports():
+    """Import scikit-learn and joblib once, in one thread, before any other thread uses them
+
+    Two threads importing the same package for the first time can trip Python's
+    import deadlock detection, so training, tuning and model loads all wait for this.
+    """
+    global ml_imports_task
+    if ml_imports_task is None or ml_imports_task.cancelled() or \
+            (ml_imports_task.done() and ml_imports_task.exception() is not None):
+        ml_imports_task = asyncio.create_task(asyncio.to_thread(import_ml_libraries))
+    await asyncio.shield(ml_imports_task)
+
+async def load_models():
+    try:
+        await warm_ml_imports()
+        loaded = await asyncio.to_thread(model_registry.load_current)
+        if loaded is None:
+            logger.info("No trained ML model found; predictions need a training run first")
+        elif model_registry.version is None:
+            # A training run in this worker may have activated a newer version meanwhile
+            model_registry.activate(*loaded)
+    except Exception as e:
+        logger.warning(f"Could not load ML models: {str(e)}")
+
+async def ensure_models_loaded() -> bool:
+    """Load the current model version once, sharing an in-flight load between requests"""
+    global model_load_task
+    if 'efficiency' in ml_models:
+        return True
+    if model_load_task is None or model_load_task.done():
+        model_load_task = asyncio.create_task(load_models())
+    await asyncio.shield(model_load_task)
+    return 'efficiency' in ml_models
+
+async def sync_shared_state():
+    """Multi-worker mode: pick up other workers' production and maintenance writes and model versions"""
+    while True:
+        await asyncio.sleep(STATE_SYNC_INTERVAL)
+        try:
+            # Alerts for these records were raised by the worker that wrote them
+            synced = await hot_store.sync(db.production_data)
+            anomaly_detector.observe_many(synced, alert=False)
+            feature_store.refresh_snapshots({str(record['machine_id']) for record in synced})
+            await feature_store.sync_maintenance(db.maintenance_logs)
+            await warm_ml_imports()
+            loaded = await asyncio.to_thread(model_registry.poll)
+            if loaded is not None:
+                model_registry.activate(*loaded)
+        except Exception as e:
+            logger.warning(f"Shared state sync failed: {str(e)}")
+
+async def run_retention() -> Optional[dict]:
+    """Archive old production months unless another worker holds the retention lease"""
+    if not await retention.acquire_lease(db.locks, "retention", WORKER_ID, seconds=3600):
+        return None
+    try:
+        summary = await retention.compact(db, ARCHIVE_DIR, RAW_RETENTION_DAYS)
+        if summary['deleted']:
+            await write_versions.touch("production_data", machine_ids=None)
+        await db.retention_runs.insert_one(dict(summary, worker=WORKER_ID, finished_at=datetime.now(timezone.utc)))
+        return summary
+    finally:
+        await retention.release_lease(db.locks, "retention", WORKER_ID)
+
+async def retention_loop():
+    while True:
+        try:
+            await run_retention()
+        except Exception as e:
+            logger.warning(f"Retention run failed: {str(e)}")
+        await asyncio.sleep(RETENTION_INTERVAL_HOURS * 3600)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the worker before it accepts requests
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not ensure indexes: {str(e)}")
+    await backfill_machine_search_keys()
+    try:
+        await fail_interrupted_jobs()
+    except Exception as e:
+        logger.warning(f"Could not check for interrupted jobs: {str(e)}")
+    try:
+        await write_versions.start()
+    except Exception as e:
+        logger.warning(f"Could not read the shared write versions: {str(e)}")
+    await load_hot_store()
+    
+    background = [asyncio.create_task(init_reliability()), asyncio.create_task(init_feature_store())]
+    if PRELOAD_MODELS:
+        # Models (and scikit-learn) load off the readiness path
+        background.append(asyncio.create_task(ensure_models_loaded()))
+    if MULTI_WORKER:
+        background.append(asyncio.create_task(sync_shared_state()))
+    if RETENTION_ENABLED:
+        background.append(asyncio.create_task(retention_loop()))
+    try:
+        yield
+    finally:
+        tuning_jobs = list(tuning_tasks.values())
+        for task in background + tuning_jobs:
+            task.cancel()
+        # Let cancelled tuning jobs record their status before the client closes
+        if tuning_jobs:
+            await asyncio.wait(tuning_jobs, timeout=5)
+        client.close()
+        analytics_client.close()
+
+# Create the main app without a prefix
+app = FastAPI(
+    title="Industrial Analytics Platform",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    # A body list over its max_length (e.g. an oversized batch) is a 413, without echoing the payload
+    for error in exc.errors():
+        if error['type'] == 'too_long' and tuple(error['loc']) == ('body',):
+            return ORJSONResponse(
+                status_code=413,
+                content={"detail": f"Batch too large (max {error['ctx']['max_length']} records)"}
+            )
+    return await request_validation_exception_handler(request, exc)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -715,8 +1692,4 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
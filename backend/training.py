@@ -0,0 +1,151 @@
+"""Parallel training of per-partition models (global, per machine type or per site).
+
+The feature matrix and targets are written once to ``.npy`` files and every
+worker process opens them with ``mmap_mode='r'``: the data is shared read-only
+through the page cache and each worker only copies the rows of its own
+partition. A global model is always trained alongside the partitions (in the
+same pool) and serves machines whose partition has too little data.
+
+Models are registered under ``<target>`` for the global model and
+``<target>.p<n>`` for partition ``n``; the version metadata maps partition
+values to model names so prediction can route each machine.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEYS = ('global', 'type', 'site')
+GLOBAL_PARTITION = '__global__'
+TARGET_NAMES = ('efficiency', 'oee')
+DEFAULT_PARAMS = {'n_estimators': 100, 'random_state': 42}
+MIN_PARTITION_SAMPLES = 50
+
+
+def partition_rows(machine_ids: List[str], machines: Dict[str, dict], partition_by: str) -> Dict[str, np.ndarray]:
+    """Row indices per partition value (always including the global partition)."""
+    partitions = {GLOBAL_PARTITION: np.arange(len(machine_ids))}
+    if partition_by == 'global':
+        return partitions
+
+    grouped: Dict[str, List[int]] = {}
+    for index, machine_id in enumerate(machine_ids):
+        value = (machines.get(machine_id) or {}).get(partition_by)
+        if value is not None:
+            grouped.setdefault(str(value), []).append(index)
+    for value, indices in grouped.items():
+        if len(indices) >= MIN_PARTITION_SAMPLES:
+            partitions[value] = np.asarray(indices)
+        else:
+            logger.info("Partition %s=%s has %d rows; it will use the global model", partition_by, value, len(indices))
+    return partitions
+
+
+def fit_models(X: np.ndarray, targets: Dict[str, np.ndarray], params: Optional[Dict[str, dict]] = None, n_jobs: int = 1):
+    """Fit one forest per target on an 80/20 split. Returns (models, metrics).
+
+    ``params`` optionally maps a target to forest parameters (e.g. from a tuning job).
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    train_index, test_index = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    X_train, X_test = X[train_index], X[test_index]
+
+    models, metrics = {}, {'training_samples': int(len(X))}
+    for name, y in targets.items():
+        model = RandomForestRegressor(n_jobs=n_jobs, **dict(DEFAULT_PARAMS, **(params or {}).get(name, {})))
+        model.fit(X_train, y[train_index])
+        predicted = model.predict(X_test)
+        # Served single-threaded; training parallelism must not leak into prediction
+        model.set_params(n_jobs=None)
+        models[name] = model
+        metrics[f'{name}_r2_score'] = float(r2_score(y[test_index], predicted))
+        metrics[f'{name}_mse'] = float(mean_squared_error(y[test_index], predicted))
+    return models, metrics
+
+
+def _fit_partition(data_dir: str, partition: str, indices: np.ndarray, params: Optional[Dict[str, dict]]):
+    """Worker entry point: fit one partition from the memory-mapped arrays."""
+    X = np.load(os.path.join(data_dir, 'features.npy'), mmap_mode='r')
+    targets = {
+        name: np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r')
+        for name in TARGET_NAMES
+    }
+    models, metrics = fit_models(
+        np.asarray(X[indices]), {name: np.asarray(y[indices]) for name, y in targets.items()}, params
+    )
+    return partition, models, metrics
+
+
+def train_partitions(
+    X: np.ndarray,
+    targets: Dict[str, np.ndarray],
+    partitions: Dict[str, np.ndarray],
+    params: Optional[Dict[str, dict]] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Tuple[dict, dict]]:
+    """Train every partition, in parallel processes when there is more than one.
+
+    Blocking; run it in a thread from the event loop. Returns
+    ``{partition: (models, metrics)}``.
+    """
+    max_workers = max(1, min(len(partitions), max_workers or os.cpu_count() or 1))
+    data_dir = tempfile.mkdtemp(prefix='training-')
+    try:
+        np.save(os.path.join(data_dir, 'features.npy'), np.ascontiguousarray(X, dtype=np.float64))
+        for name in TARGET_NAMES:
+            np.save(os.path.join(data_dir, f'{name}.npy'), np.ascontiguousarray(targets[name], dtype=np.float64))
+
+        if max_workers == 1:
+            results = [_fit_partition(data_dir, partition, indices, params) for partition, indices in partitions.items()]
+        else:
+            # spawn: forking a process that runs an event loop and driver threads is unsafe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(_fit_partition, data_dir, partition, indices, params)
+                    for partition, indices in partitions.items()
+                ]
+                results = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {partition: (models, metrics) for partition, models, metrics in results}
+
+
+def registry_bundle(results: Dict[str, Tuple[dict, dict]], partition_by: str) -> Tuple[Dict[str, object], dict]:
+    """Flatten partition results into registry model names plus routing metadata."""
+    models, routes = {}, {}
+    global_models, global_metrics = results[GLOBAL_PARTITION]
+    models.update(global_models)
+
+    partitioned = sorted(partition for partition in results if partition != GLOBAL_PARTITION)
+    for number, partition in enumerate(partitioned, start=1):
+        partition_models, metrics = results[partition]
+        names = {}
+        for target, model in partition_models.items():
+            names[target] = f'{target}.p{number}'
+            models[names[target]] = model
+        routes[partition] = dict(metrics, models=names)
+
+    metadata = dict(global_metrics, partition_by=partition_by, partitions=routes)
+    return models, metadata
+
+
+def route(metadata: dict, machine: Optional[dict]) -> Tuple[Optional[str], Dict[str, str]]:
+    """(partition value, {target: model name}) serving a machine; the global models by default."""
+    partition_by = metadata.get('partition_by', 'global')
+    if machine is not None and partition_by != 'global':
+        value = machine.get(partition_by)
+        partition = metadata.get('partitions', {}).get(str(value))
+        if partition is not None:
+            return str(value), partition['models']
+    return None, {target: target for target in TARGET_NAMES}
@@ -0,0 +1,154 @@
+"""Hyperparameter search for the forest models.
+
+Candidates are drawn at random and raced with successive halving, using the
+number of trees as the budget. Every candidate first gets a small forest; only
+the best third move on, with three times as many trees. Weak configurations
+are dropped early instead of being trained to full size.
+
+The k-fold splits are computed once and reused for every candidate and for
+both targets. The feature matrix is built once, and joblib memory-maps it into
+the worker processes, so candidates running across all cores share it.
+
+The search finishes with an accuracy-vs-latency frontier. It lists the
+configurations that no other configuration beats on both cross-validated R²
+and single-batch prediction latency, so the cheapest model that meets an
+accuracy bar can be picked.
+"""
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+PARAM_DISTRIBUTIONS = {
+    'max_depth': [None, 4, 8, 12, 16, 24],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'max_features': [1.0, 0.5, 'sqrt'],
+    'max_samples': [None, 0.5, 0.8],
+}
+# Rows per prediction call of /ml/predict (one week ahead)
+LATENCY_BATCH_ROWS = 7
+LATENCY_REPEATS = 25
+FRONTIER_MAX_POINTS = 8
+
+
+def cached_folds(n_rows: int, n_splits: int = 5, random_state: int = 42) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """K-fold (train, test) index arrays, materialised once for every candidate."""
+    from sklearn.model_selection import KFold
+
+    return list(KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(np.arange(n_rows)))
+
+
+def search(
+    X: np.ndarray,
+    y: np.ndarray,
+    folds: List[Tuple[np.ndarray, np.ndarray]],
+    n_candidates: int = 32,
+    min_estimators: int = 25,
+    max_estimators: int = 400,
+    factor: int = 3,
+    random_state: int = 42,
+) -> Tuple[List[dict], int]:
+    """Successive-halving randomised search; returns (evaluated configurations, iterations)."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV
+
+    searcher = HalvingRandomSearchCV(
+        RandomForestRegressor(random_state=random_state),
+        PARAM_DISTRIBUTIONS,
+        n_candidates=n_candidates,
+        factor=factor,
+        resource='n_estimators',
+        min_resources=min_estimators,
+        max_resources=max_estimators,
+        cv=folds,
+        scoring='r2',
+        refit=False,
+        return_train_score=False,
+        random_state=random_state,
+        n_jobs=-1,
+    )
+    searcher.fit(X, y)
+
+    results = searcher.cv_results_
+    evaluated = []
+    for index, params in enumerate(results['params']):
+        score = results['mean_test_score'][index]
+        if np.isnan(score):
+            continue
+        evaluated.append({
+            'params': {key: value.item() if isinstance(value, np.generic) else value for key, value in params.items()},
+            'iteration': int(results['iter'][index]),
+            'r2_score': float(score),
+            'r2_std': float(results['std_test_score'][index]),
+            'fit_seconds': float(results['mean_fit_time'][index]),
+        })
+    return evaluated, int(searcher.n_iterations_)
+
+
+def measure_latency(X: np.ndarray, y: np.ndarray, params: dict, random_state: int = 42) -> float:
+    """Median milliseconds to predict one /ml/predict batch with ``params`` fitted on ``X``."""
+    from sklearn.ensemble import RandomForestRegressor
+
+    model = RandomForestRegressor(random_state=random_state, n_jobs=-1, **params)
+    model.fit(X, y)
+    model.set_params(n_jobs=None)
+    batch = X[:LATENCY_BATCH_ROWS]
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict(batch)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def pareto_frontier(points: List[dict], cost_key: str) -> List[dict]:
+    """Points not beaten on both ``r2_score`` (higher) and ``cost_key`` (lower), cheapest first."""
+    frontier, best_score = [], -np.inf
+    for point in sorted(points, key=lambda point: (point[cost_key], -point['r2_score'])):
+        if point['r2_score'] > best_score:
+            frontier.append(point)
+            best_score = point['r2_score']
+    return frontier
+
+
+def tune_target(X: np.ndarray, y: np.ndarray, folds, **search_options) -> dict:
+    evaluated, iterations = search(X, y, folds, **search_options)
+
+    # Latency is only measured on the frontier of the training-cost proxy, then re-filtered
+    candidates = pareto_frontier(evaluated, 'fit_seconds')[-FRONTIER_MAX_POINTS:]
+    for point in candidates:
+        point['latency_ms'] = round(measure_latency(X, y, point['params']), 3)
+    frontier = pareto_frontier(candidates, 'latency_ms')
+
+    return {
+        'best': max(frontier, key=lambda point: point['r2_score']),
+        'frontier': frontier,
+        'candidates_evaluated': sum(1 for point in evaluated if point['iteration'] == 0),
+        'fits': len(evaluated) * len(folds),
+        'iterations': iterations,
+    }
+
+
+def tune(X: np.ndarray, targets: Dict[str, np.ndarray], cv_folds: int = 5, **search_options) -> dict:
+    """Tune one forest per target on shared folds. Blocking; run it off the event loop."""
+    folds = cached_folds(len(X), cv_folds)
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    return {name: tune_target(X, y, folds, **search_options) for name, y in targets.items()}
+
+
+def select_params(result: dict, min_r2: Optional[float] = None) -> Dict[str, dict]:
+    """Per-target parameters: the lowest-latency frontier point with R² >= ``min_r2``.
+
+    Without a bar (or when no point meets it) the most accurate point is used.
+    """
+    selected = {}
+    for name, target in result.items():
+        choice = target['best']
+        if min_r2 is not None:
+            eligible = [point for point in target['frontier'] if point['r2_score'] >= min_r2]
+            if eligible:
+                choice = min(eligible, key=lambda point: point['latency_ms'])
+        selected[name] = dict(choice['params'])
+    return selected
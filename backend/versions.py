@@ -0,0 +1,114 @@
+"""Write versions and conditional GET for the polled analytics endpoints.
+
+Dashboards poll ``/dashboard``, ``/analytics/trends`` and ``/predictions/{id}``
+much more often than the data behind them changes. Every write path records
+the time of its write under ``<collection>`` and ``<collection>:<machine_id>``
+(``<collection>:*`` for fleet-wide changes such as archiving). A read endpoint
+takes the newest time among the keys it depends on as its ``Last-Modified``,
+derives a weak ETag from it and its parameters, and answers a matching
+``If-None-Match`` with ``304`` before running its query.
+
+With a single worker the times are kept in process. With several workers they
+live in a ``write_versions`` collection and are read with one ``_id`` lookup,
+so every worker hands out the same validators. Writes made before the tracker
+started (or outside the API) are dated at its ``since`` time.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+SINCE_KEY = '__since__'
+
+
+def normalize(value: datetime) -> datetime:
+    """Naive UTC truncated to milliseconds, the precision MongoDB stores."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def machine_keys(collection: str, machine_id: Optional[str] = None) -> list:
+    """Keys a read of ``collection`` (optionally one machine's rows) depends on."""
+    if machine_id is None:
+        return [collection]
+    return [f'{collection}:{machine_id}', f'{collection}:*']
+
+
+class WriteVersions:
+    def __init__(self, collection=None):
+        self.collection = collection  # shared store; None keeps the versions in process
+        self.since = normalize(datetime.now(timezone.utc))
+        self._local: Dict[str, datetime] = {}
+
+    async def start(self):
+        """Adopt the shared ``since`` time, so all workers date old data alike."""
+        if self.collection is None:
+            return
+        doc = await self.collection.find_one_and_update(
+            {'_id': SINCE_KEY},
+            {'$setOnInsert': {'updated_at': self.since}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.since = normalize(doc['updated_at'])
+
+    async def touch(self, *collections: str, machine_ids: Optional[Iterable[str]] = (), at: Optional[datetime] = None):
+        """Record a write to ``collections``; ``machine_ids=None`` marks every machine's rows."""
+        at = normalize(at or datetime.now(timezone.utc))
+        machine_ids = None if machine_ids is None else set(machine_ids)
+        keys = []
+        for collection in collections:
+            keys.append(collection)
+            if machine_ids is None:
+                keys.append(f'{collection}:*')
+            else:
+                keys.extend(f'{collection}:{machine_id}' for machine_id in machine_ids)
+
+        if self.collection is None:
+            for key in keys:
+                if key not in self._local or self._local[key] < at:
+                    self._local[key] = at
+            return
+        await self.collection.bulk_write(
+            [UpdateOne({'_id': key}, {'$max': {'updated_at': at}}, upsert=True) for key in keys],
+            ordered=False,
+        )
+
+    async def last_modified(self, keys: Iterable[str], *extra: Optional[datetime]) -> datetime:
+        """Newest write time among ``keys`` and any ``extra`` times, never before ``since``."""
+        keys = list(keys)
+        if self.collection is None:
+            stamps = [self._local.get(key) for key in keys]
+        elif keys:
+            docs = await self.collection.find({'_id': {'$in': keys}}).to_list(len(keys))
+            stamps = [doc['updated_at'] for doc in docs]
+        else:
+            stamps = []
+        stamps.extend(extra)
+        return max([self.since] + [normalize(stamp) for stamp in stamps if stamp is not None])
+
+
+def etag(scope: str, last_modified: datetime, **params) -> str:
+    """Weak validator for a response of ``scope`` with ``params`` as of ``last_modified``."""
+    parts = [scope, last_modified.isoformat()]
+    parts.extend(f'{name}={params[name]}' for name in sorted(params))
+    return 'W/"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison of ``tag`` against an ``If-None-Match`` header."""
+    if not if_none_match:
+        return False
+    opaque = tag[2:] if tag.startswith('W/') else tag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or (candidate[2:] if candidate.startswith('W/') else candidate) == opaque:
+            return True
+    return False
@@ -0,0 +1,106 @@
+"""Benchmark JSON serialisation of large list responses.
+
+Compares the previous response path (a pydantic model per document, validated
+again against ``response_model`` and encoded with the stdlib json encoder)
+against the current one (raw documents returned through ``ORJSONResponse``).
+Both endpoints are served by a throwaway FastAPI app and called in-process, so
+no MongoDB is needed.
+
+Usage:
+    python benchmarks/bench_json_responses.py [--rows 10000] [--iterations 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from server import ProductionData, db_rows_response, model_projection  # noqa: E402
+
+
+def make_documents(rows: int) -> List[dict]:
+    """Production documents shaped like ``db.production_data.find(..., model_projection(...))`` returns them."""
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "machine_id": f"machine-{i % 250}",
+            "date": (start + timedelta(days=i // 250)).strftime("%Y-%m-%d"),
+            "output": 800.0 + (i % 400),
+            "downtime": 10.0 + (i % 50),
+            "efficiency": 75.0 + (i % 20),
+            "oee": 70.0 + (i % 25),
+            "quality_rate": 0.95,
+            "availability": 92.5,
+            "performance": 85.0,
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+
+
+def build_app(documents: List[dict]) -> FastAPI:
+    app = FastAPI()
+    assert set(model_projection(ProductionData)) - {"_id"} == set(documents[0])
+
+    @app.get("/legacy", response_model=List[ProductionData], response_class=JSONResponse)
+    async def legacy():
+        return [ProductionData(**doc) for doc in documents]
+
+    @app.get("/fast", response_model=List[ProductionData])
+    async def fast():
+        return db_rows_response(ProductionData, documents)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, iterations: int):
+    await client.get(path)  # warm up
+    total_bytes = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        response = await client.get(path)
+        response.raise_for_status()
+        total_bytes += len(response.content)
+    elapsed = time.perf_counter() - started
+    return total_bytes / iterations, elapsed / iterations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    app = build_app(make_documents(args.rows))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for name in ("legacy", "fast"):
+            results[name] = await measure(client, f"/{name}", args.iterations)
+
+    print(f"{args.rows} rows per response, {args.iterations} iterations")
+    print(f"{'path':<8} {'bytes':>12} {'ms/response':>12} {'MB/s':>10} {'rows/s':>12}")
+    for name, (size, seconds) in results.items():
+        print(
+            f"{name:<8} {size:>12,.0f} {seconds * 1000:>12.1f} "
+            f"{size / seconds / 1e6:>10.1f} {args.rows / seconds:>12,.0f}"
+        )
+    print(f"speed-up: {results['legacy'][1] / results['fast'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,300 @@
+"""Load-test the API with a simulated plant floor.
+
+Four kinds of actors run concurrently for ``--duration`` seconds:
+
+* dashboard pollers refresh the dashboard, trends and alerts, and
+  occasionally request a forecast; like a browser, they revalidate the
+  dashboard and trends with ``If-None-Match`` (``304`` replies are counted
+  per endpoint);
+* edge gateways post production records for their machines, one by one or
+  through ``/production/batch``;
+* CSV uploaders periodically post a generated backfill file;
+* a retrainer periodically retrains the models.
+
+Every actor works in a closed loop with jittered think time. The report gives
+per-endpoint throughput, latency percentiles and error rates (429/503
+rejections from admission control are counted separately).
+
+By default the app is served in-process through ``httpx.ASGITransport``
+(its lifespan included), against the MongoDB configured in ``MONGO_URL`` and
+``DB_NAME``; use a throwaway database. ``--base-url`` targets a running
+deployment instead, e.g. ``uvicorn server:app --workers 4`` on localhost.
+
+Usage:
+    python benchmarks/plant_floor_load.py [--base-url http://localhost:8001]
+        [--duration 60] [--pollers 50] [--gateways 20] [--uploaders 1]
+        [--retrainers 1] [--machines 20] [--json results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+import httpx  # noqa: E402
+
+MACHINE_TYPES = ("CNC Machine", "Conveyor", "Robot", "Packaging", "Inspection")
+SITES = ("Factory 1", "Factory 2", "Factory 3")
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint label."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, label: str, status: int, seconds: float):
+        self.latencies[label].append(seconds)
+        self.statuses[label][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        report = {}
+        for label in sorted(self.latencies):
+            latencies = sorted(self.latencies[label])
+            statuses = self.statuses[label]
+            count = len(latencies)
+            errors = sum(n for status, n in statuses.items() if status == 0 or status >= 400)
+            report[label] = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "error_rate": round(errors / count, 4),
+                "rejected_429": statuses.get(429, 0),
+                "rejected_503": statuses.get(503, 0),
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                "p90_ms": round(_percentile(latencies, 90) * 1000, 1),
+                "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1),
+                "statuses": {str(status): n for status, n in sorted(statuses.items())},
+            }
+        return report
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, args, recorder: Recorder):
+        self.client = client
+        self.args = args
+        self.recorder = recorder
+        self.machine_ids: List[str] = []
+        self.deadline = 0.0
+
+    async def call(self, label: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(label, 0, time.perf_counter() - started)
+            return None
+        self.recorder.record(label, response.status_code, time.perf_counter() - started)
+        return response
+
+    async def think(self, interval: float):
+        """Sleep ``interval`` seconds with +/-25% jitter, never past the deadline."""
+        remaining = self.deadline - time.perf_counter()
+        await asyncio.sleep(max(0.0, min(remaining, interval * random.uniform(0.75, 1.25))))
+
+    def running(self) -> bool:
+        return time.perf_counter() < self.deadline
+
+    async def login(self, role: str) -> Dict[str, str]:
+        """Register a fresh user; returns its authorization header."""
+        email = f"load-{role}-{uuid.uuid4().hex[:8]}@example.com"
+        credentials = {"email": email, "password": "load-test"}
+        response = await self.client.post("/api/auth/register", json=dict(credentials, username=email))
+        response.raise_for_status()
+        response = await self.client.post("/api/auth/login", json=credentials)
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def setup(self):
+        # Pollers share the default user; each gateway and uploader is its own client,
+        # as rate limits are per user
+        self.client.headers.update(await self.login("dashboard"))
+
+        response = await self.client.get("/api/machines")
+        response.raise_for_status()
+        self.machine_ids = [machine["id"] for machine in response.json()]
+        for i in range(len(self.machine_ids), self.args.machines):
+            response = await self.client.post("/api/machines", json={
+                "name": f"Load Machine {i + 1}",
+                "type": MACHINE_TYPES[i % len(MACHINE_TYPES)],
+                "site": SITES[i % len(SITES)],
+            })
+            response.raise_for_status()
+            self.machine_ids.append(response.json()["id"])
+
+    def production_row(self, machine_id: str, date: str) -> dict:
+        return {
+            "machine_id": machine_id,
+            "date": date,
+            "output": random.uniform(800, 1200),
+            "downtime": random.uniform(5, 45),
+            "efficiency": random.uniform(80, 95),
+            "quality_rate": random.uniform(0.92, 0.99),
+        }
+
+    async def revalidate(self, label: str, path: str, etags: Dict[str, str], **kwargs):
+        headers = {"If-None-Match": etags[path]} if path in etags else {}
+        response = await self.call(label, "GET", path, headers=headers, **kwargs)
+        if response is not None and "etag" in response.headers:
+            etags[path] = response.headers["etag"]
+
+    async def dashboard_poller(self):
+        etags: Dict[str, str] = {}
+        while self.running():
+            await self.revalidate("GET /dashboard", "/api/dashboard", etags)
+            await self.revalidate("GET /analytics/trends", "/api/analytics/trends", etags, params={"days": 30})
+            await self.call("GET /alerts", "GET", "/api/alerts")
+            if random.random() < self.args.predict_ratio:
+                machine_id = random.choice(self.machine_ids)
+                await self.call("POST /ml/predict", "POST", f"/api/ml/predict/{machine_id}")
+            await self.think(self.args.poll_interval)
+
+    async def gateway(self, machine_ids: List[str], headers: Dict[str, str]):
+        while self.running():
+            today = datetime.now().strftime("%Y-%m-%d")
+            if self.args.gateway_batch > 1:
+                rows = [self.production_row(random.choice(machine_ids), today) for _ in range(self.args.gateway_batch)]
+                await self.call("POST /production/batch", "POST", "/api/production/batch", json=rows, headers=headers)
+            else:
+                row = self.production_row(random.choice(machine_ids), today)
+                await self.call("POST /production", "POST", "/api/production", json=row, headers=headers)
+            await self.think(self.args.gateway_interval)
+
+    async def csv_uploader(self, headers: Dict[str, str]):
+        while self.running():
+            start = datetime.now() - timedelta(days=random.randint(100, 300))
+            buffer = io.StringIO()
+            buffer.write("machine_id,date,output,downtime,efficiency,quality_rate\n")
+            for _ in range(self.args.csv_rows):
+                row = self.production_row(
+                    random.choice(self.machine_ids),
+                    (start - timedelta(days=random.randint(0, 60))).strftime("%Y-%m-%d"),
+                )
+                buffer.write("{machine_id},{date},{output:.2f},{downtime:.2f},{efficiency:.2f},{quality_rate:.3f}\n".format(**row))
+            files = {"file": ("backfill.csv", buffer.getvalue().encode(), "text/csv")}
+            await self.call("POST /upload-csv", "POST", "/api/upload-csv", files=files, headers=headers)
+            await self.think(self.args.csv_interval)
+
+    async def retrainer(self):
+        while self.running():
+            await self.think(self.args.train_interval)
+            if self.running():
+                await self.call("POST /ml/train", "POST", "/api/ml/train")
+
+    async def run(self) -> float:
+        await self.setup()
+        # Predictions need a model; train one up front outside the measured window
+        await self.client.post("/api/ml/train")
+
+        gateway_headers = await asyncio.gather(*(self.login("gateway") for _ in range(self.args.gateways)))
+        uploader_headers = await asyncio.gather(*(self.login("uploader") for _ in range(self.args.uploaders)))
+
+        gateways = max(1, self.args.gateways)
+        actors = [self.dashboard_poller() for _ in range(self.args.pollers)]
+        actors += [
+            self.gateway(self.machine_ids[i::gateways] or self.machine_ids, headers)
+            for i, headers in enumerate(gateway_headers)
+        ]
+        actors += [self.csv_uploader(headers) for headers in uploader_headers]
+        actors += [self.retrainer() for _ in range(self.args.retrainers)]
+
+        started = time.perf_counter()
+        self.deadline = started + self.args.duration
+        await asyncio.gather(*actors)
+        return time.perf_counter() - started
+
+
+@contextlib.asynccontextmanager
+async def open_client(args):
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+            yield client
+        return
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from server import app
+
+    # ASGITransport does not run the lifespan; run it around the whole test
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://plant-floor", timeout=timeout) as client:
+            yield client
+
+
+def print_report(report: dict, elapsed: float, target: str):
+    print(f"\n{target}: {elapsed:.1f} s")
+    header = f"{'endpoint':<26} {'reqs':>7} {'req/s':>8} {'err%':>6} {'429':>5} {'503':>5} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for label, row in report.items():
+        print(
+            f"{label:<26} {row['requests']:>7} {row['throughput_rps']:>8.1f} {row['error_rate'] * 100:>6.1f} "
+            f"{row['rejected_429']:>5} {row['rejected_503']:>5} {row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} "
+            f"{row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+        )
+    total = sum(row["requests"] for row in report.values())
+    print(f"{'total':<26} {total:>7} {total / elapsed:>8.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="target a running API instead of the in-process app")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--machines", type=int, default=20, help="machines to make sure exist")
+    parser.add_argument("--pollers", type=int, default=50, help="concurrent dashboard pollers")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--predict-ratio", type=float, default=0.1, help="share of polls that request a forecast")
+    parser.add_argument("--gateways", type=int, default=20, help="concurrent edge gateways")
+    parser.add_argument("--gateway-interval", type=float, default=1.0)
+    parser.add_argument("--gateway-batch", type=int, default=1, help="records per post (>1 uses /production/batch)")
+    parser.add_argument("--uploaders", type=int, default=1, help="concurrent CSV uploaders")
+    parser.add_argument("--csv-interval", type=float, default=30.0)
+    parser.add_argument("--csv-rows", type=int, default=500)
+    parser.add_argument("--retrainers", type=int, default=1)
+    parser.add_argument("--train-interval", type=float, default=120.0)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "plant_floor_load")
+
+    recorder = Recorder()
+    async with open_client(args) as client:
+        elapsed = await Scenario(client, args, recorder).run()
+
+    report = recorder.report(elapsed)
+    target = args.base_url or "in-process app"
+    print_report(report, elapsed, target)
+    if args.json:
+        Path(args.json).write_text(json.dumps(
+            {"target": target, "elapsed_seconds": elapsed, "arguments": vars(args), "endpoints": report}, indent=2
+        ))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
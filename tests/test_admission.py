@@ -0,0 +1,69 @@
+"""Token buckets answer 429 and full concurrency queues 503, both with a Retry-After."""
+import asyncio
+
+import pytest
+
+from admission import ConcurrencyLimit, Policy, RateLimiter, Rejected, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_reports_the_wait():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.25) == pytest.approx(0.25)
+    assert bucket.take(0.5) == 0.0
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=2, now=0.0)
+    bucket.take(0.0)
+    bucket.take(0.0)
+
+    assert bucket.take(100.0) == 0.0
+    assert bucket.take(100.0) == 0.0
+    assert bucket.take(100.0) == pytest.approx(1.0)
+
+
+def test_rate_limiter_rejects_with_429_and_whole_second_retry_after():
+    limiter = RateLimiter()
+    policy = Policy(rate=0.1, burst=1, group="ingest", max_concurrent=1, max_queue=0)
+    limiter.check(("user", "production"), policy)
+    limiter.check(("other", "production"), policy)
+
+    with pytest.raises(Rejected) as excinfo:
+        limiter.check(("user", "production"), policy)
+    assert excinfo.value.status_code == 429
+    assert 1 <= excinfo.value.retry_after <= 10
+
+
+def test_concurrency_limit_rejects_when_the_queue_is_full():
+    async def scenario():
+        limit = ConcurrencyLimit(max_concurrent=1, max_queue=0, queue_timeout=1.0)
+        async with limit.slot():
+            with pytest.raises(Rejected) as excinfo:
+                async with limit.slot():
+                    pass
+        return limit, excinfo.value
+
+    limit, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.retry_after >= 1
+    assert limit.rejected == 1
+    assert limit.active == 0
+
+
+def test_concurrency_limit_rejects_after_the_queue_timeout():
+    async def scenario():
+        limit = ConcurrencyLimit(max_concurrent=1, max_queue=1, queue_timeout=0.01)
+        async with limit.slot():
+            with pytest.raises(Rejected) as excinfo:
+                async with limit.slot():
+                    pass
+            assert limit.waiting == 0
+        # The slot is free again once the holder leaves
+        async with limit.slot():
+            pass
+        return excinfo.value
+
+    assert asyncio.run(scenario()).status_code == 503
@@ -0,0 +1,78 @@
+"""Running statistics and the z-score threshold of the anomaly detector."""
+import math
+
+import numpy as np
+import pytest
+
+from anomaly import AnomalyDetector, RunningStats
+
+
+def test_running_stats_match_numpy_mean_and_variance():
+    values = np.random.default_rng(0).normal(100, 5, 200)
+    stats = RunningStats()
+    for value in values:
+        stats.update(float(value), alpha=0.1)
+
+    assert stats.count == 200
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var(ddof=1))
+
+
+def test_z_score_is_none_without_spread():
+    stats = RunningStats()
+    for _ in range(5):
+        stats.update(10.0, alpha=0.1)
+
+    assert stats.z_score(12.0) is None
+
+
+def seeded_detector(**options):
+    detector = AnomalyDetector(**options)
+    rng = np.random.default_rng(1)
+    detector.seed("m1", {
+        "output": rng.normal(1000, 10, 50),
+        "downtime": rng.normal(30, 2, 50),
+        "efficiency": rng.normal(85, 1, 50),
+    })
+    return detector
+
+
+def test_harmful_deviation_beyond_threshold_alerts():
+    detector = seeded_detector(z_threshold=3.0)
+    stats = detector.stats("m1", "output")
+    low = stats.ewma - 4 * math.sqrt(stats.ewmvar)
+
+    alerts = detector.observe({"machine_id": "m1", "id": "p1", "date": "2026-01-01", "output": low})
+    assert [alert["metric"] for alert in alerts] == ["output"]
+    assert alerts[0]["z_score"] <= -3.0
+    assert alerts[0]["severity"] == "warning"
+
+
+def test_deviation_in_the_harmless_direction_or_below_threshold_is_ignored():
+    detector = seeded_detector(z_threshold=3.0)
+    output = detector.stats("m1", "output")
+    downtime = detector.stats("m1", "downtime")
+
+    record = {
+        "machine_id": "m1",
+        "output": output.ewma + 10 * math.sqrt(output.ewmvar),
+        "downtime": downtime.ewma - 10 * math.sqrt(downtime.ewmvar),
+        "efficiency": detector.stats("m1", "efficiency").ewma,
+    }
+    assert detector.observe(record) == []
+
+
+def test_deviation_of_twice_the_threshold_is_critical():
+    detector = seeded_detector(z_threshold=3.0)
+    stats = detector.stats("m1", "downtime")
+
+    alerts = detector.observe({"machine_id": "m1", "downtime": stats.ewma + 7 * math.sqrt(stats.ewmvar)})
+    assert alerts[0]["severity"] == "critical"
+
+
+def test_no_alerts_before_min_samples():
+    detector = AnomalyDetector(min_samples=10)
+    for value in [100.0, 101.0, 99.0]:
+        detector.observe({"machine_id": "m1", "output": value})
+
+    assert detector.observe({"machine_id": "m1", "output": 0.0}) == []
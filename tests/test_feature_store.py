@@ -0,0 +1,100 @@
+"""Rolling-window features only see history strictly before the target day."""
+import asyncio
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from feature_store import FEATURE_COLUMNS, FeatureStore, compute_features
+from hot_store import HotProductionStore
+
+
+def history(n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.arange(n_days, dtype=np.int64) + 19000
+    columns = {metric: rng.uniform(50, 100, n_days) for metric in ("output", "downtime", "efficiency", "oee")}
+    return days, columns
+
+
+def test_features_ignore_the_target_day_and_later():
+    days, columns = history(60)
+    maintenance = np.array([days[10], days[45]])
+    targets = days[30:]
+    _, features = compute_features(days, columns, targets, maintenance)
+
+    for i, target in enumerate(targets):
+        before = days < target
+        truncated = {metric: values[before] for metric, values in columns.items()}
+        _, expected = compute_features(days[before], truncated, [target], maintenance[maintenance < target])
+        for name in FEATURE_COLUMNS:
+            np.testing.assert_allclose(features[name][i], expected[name][0], err_msg=name)
+
+
+def test_changing_the_target_day_does_not_change_its_features():
+    days, columns = history(40)
+    _, original = compute_features(days, columns, [days[25]])
+
+    changed = {metric: values.copy() for metric, values in columns.items()}
+    for values in changed.values():
+        values[25:] *= 10
+    _, recomputed = compute_features(days, changed, [days[25]])
+
+    for name in FEATURE_COLUMNS:
+        np.testing.assert_array_equal(original[name], recomputed[name], err_msg=name)
+    assert original["efficiency_lag_1"][0] == columns["efficiency"][24]
+
+
+def test_targets_without_earlier_history_are_masked():
+    days, columns = history(5)
+    valid, features = compute_features(days, columns, [days[0] - 3, days[0], days[0] + 1])
+
+    assert valid.tolist() == [False, False, True]
+    assert len(features["output_mean_7d"]) == 1
+    assert features["horizon_days"][0] == 1
+
+
+class LogCollection:
+    """Just enough of a motor collection for the maintenance tailing queries."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query, projection):
+        bound = query.get("created_at", {}).get("$gt")
+        docs = [doc for doc in self.docs if bound is None or doc["created_at"] > bound]
+
+        async def cursor():
+            for doc in docs:
+                yield dict(doc)
+        return cursor()
+
+
+def test_workers_agree_on_maintenance_recorded_elsewhere():
+    today = date.today()
+    rows = [
+        {"id": f"p{i}", "machine_id": "m1", "date": (today - timedelta(days=20 - i)).isoformat(),
+         "created_at": datetime(2026, 1, 1), "output": 900.0 + i, "downtime": 20.0, "efficiency": 80.0, "oee": 60.0}
+        for i in range(20)
+    ]
+    logs = LogCollection()
+    workers = []
+    for _ in range(2):
+        hot = HotProductionStore(window_days=60)
+        hot.add(rows)
+        workers.append(FeatureStore(hot))
+    receiver, other = workers
+
+    async def scenario():
+        await other.load_maintenance(logs)
+        log = {"id": "l1", "machine_id": "m1", "date": (today - timedelta(days=5)).isoformat(),
+               "created_at": datetime(2026, 1, 2)}
+        logs.docs.append(log)
+        await receiver.load_maintenance(logs)
+        first = await other.sync_maintenance(logs)
+        again = await other.sync_maintenance(logs)
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert first == ["m1"] and again == []
+    snapshots = [worker.refresh_snapshots(["m1"])[0] for worker in workers]
+    assert snapshots[0]["days_since_maintenance"] == snapshots[1]["days_since_maintenance"] == 5
+    assert snapshots[0]["watermark"] == snapshots[1]["watermark"]
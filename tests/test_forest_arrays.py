@@ -0,0 +1,38 @@
+"""Forests exported as node arrays predict like the fitted scikit-learn forest."""
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+from sklearn.ensemble import RandomForestRegressor  # noqa: E402
+
+from forest_arrays import MappedForest, export_forest, is_exportable  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = 3 * X[:, 0] - X[:, 3] + rng.normal(scale=0.1, size=400)
+    return RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+
+
+def test_mapped_forest_matches_sklearn(forest, tmp_path):
+    export_forest(forest, tmp_path / "model.forest")
+    mapped = MappedForest(tmp_path / "model.forest")
+
+    X = np.random.default_rng(1).normal(size=(50, 6))
+    np.testing.assert_allclose(mapped.predict(X), forest.predict(X), rtol=0, atol=1e-12)
+    assert mapped.predict(X[:0]).shape == (0,)
+
+
+def test_node_arrays_stay_memory_mapped(forest, tmp_path):
+    export_forest(forest, tmp_path / "model.forest")
+    mapped = MappedForest(tmp_path / "model.forest")
+
+    assert isinstance(mapped.threshold, np.memmap)
+    assert isinstance(mapped.value, np.memmap)
+
+
+def test_other_estimators_are_not_exported():
+    assert not is_exportable(object())
@@ -0,0 +1,104 @@
+"""The in-memory production store and the validators derived from it."""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from hot_store import HotProductionStore
+
+
+def record(record_id, day, created_at, machine_id="m1", **values):
+    row = {"id": record_id, "machine_id": machine_id, "date": day.isoformat(), "created_at": created_at,
+           "output": 1000.0, "downtime": 30.0, "efficiency": 85.0, "oee": 70.0}
+    row.update(values)
+    return row
+
+
+def test_last_modified_moves_when_rows_arrive_out_of_created_at_order():
+    store = HotProductionStore(window_days=30)
+    today = date.today()
+    later = datetime(2026, 1, 1, 12, 0, 0)
+
+    store.add([record("b", today, later)])
+    first = store.last_modified()
+    store.add([record("a", today - timedelta(days=1), later - timedelta(minutes=5), machine_id="m2")])
+
+    assert store.summary((today - timedelta(days=7)).isoformat())["records"] == 2
+    assert store.last_modified() > first
+    assert store.last_modified("m2") > first
+    assert store.last_modified("m1") == first
+
+
+def test_last_modified_ignores_rows_outside_the_window():
+    store = HotProductionStore(window_days=30)
+    store.add([record("a", date.today(), datetime(2026, 1, 1))])
+    first = store.last_modified()
+
+    store.add([record("old", date.today() - timedelta(days=60), datetime(2026, 1, 2))])
+    assert store.last_modified() == first
+
+
+def sample_rows(days, machines=("m1", "m2", "m3"), seed=0):
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    rows = []
+    for offset in range(days):
+        for machine_id in machines:
+            # Some machines report twice a day, some days are missing
+            for copy in range(int(rng.integers(0, 3))):
+                rows.append(record(f"{machine_id}-{offset}-{copy}", today - timedelta(days=offset),
+                                   datetime(2026, 1, 1), machine_id=machine_id,
+                                   output=float(rng.uniform(500, 1500)), downtime=float(rng.uniform(0, 120)),
+                                   efficiency=float(rng.uniform(50, 100)), oee=float(rng.uniform(30, 90))))
+    return rows
+
+
+def pandas_trends(rows, start_date, machine_id=None):
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame(rows)
+    df = df[df["date"] >= start_date]
+    if machine_id:
+        df = df[df["machine_id"] == machine_id]
+    return df, df.groupby("date").agg(
+        {"oee": "mean", "efficiency": "mean", "output": "sum", "downtime": "sum"}
+    ).reset_index().to_dict("records")
+
+
+@pytest.mark.parametrize("machine_id", [None, "m2"])
+def test_daily_trends_match_the_pandas_groupby(machine_id):
+    rows = sample_rows(40)
+    store = HotProductionStore(window_days=30)
+    store.add(rows)
+    start_date = (date.today() - timedelta(days=14)).isoformat()
+
+    df, expected = pandas_trends(rows, start_date, machine_id)
+    trends = store.daily_trends(start_date, machine_id)
+    assert trends["records"] == len(df)
+    assert trends["machines"] == df["machine_id"].nunique()
+    assert [day["date"] for day in trends["data"]] == [day["date"] for day in expected]
+    for got, want in zip(trends["data"], expected):
+        for name in ("oee", "efficiency", "output", "downtime"):
+            assert got[name] == pytest.approx(want[name])
+
+
+def test_summary_matches_pandas_and_prunes_at_the_window_edge():
+    rows = sample_rows(40)
+    store = HotProductionStore(window_days=30)
+    store.add(rows)
+    first_day = (date.today() - timedelta(days=30)).isoformat()
+
+    # Rows older than the window are never kept, whatever start date is asked for
+    df, _ = pandas_trends(rows, first_day)
+    summary = store.summary("2000-01-01")
+    assert summary["records"] == len(df)
+    assert summary["average_oee"] == pytest.approx(df["oee"].mean())
+    assert summary["average_efficiency"] == pytest.approx(df["efficiency"].mean())
+    assert summary["total_downtime"] == pytest.approx(df["downtime"].sum())
+    assert summary["production_output"] == pytest.approx(df["output"].sum())
+
+    # Three days later the oldest days fall out of the window on the next write
+    store._today = lambda: HotProductionStore._today() + 3
+    store.add([])
+    later_first_day = (date.today() - timedelta(days=27)).isoformat()
+    df, _ = pandas_trends(rows, later_first_day)
+    assert store.summary("2000-01-01")["records"] == len(df)
@@ -0,0 +1,61 @@
+"""Import-time budget for the API process, measured with ``python -X importtime``.
+
+Heavy ML and data libraries must stay off the import path of ``server`` so that
+workers serving health checks and auth become ready quickly.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Modules only the ML and analytics code paths may import
+DEFERRED_MODULES = ("pandas", "sklearn", "scipy", "joblib", "passlib")
+
+# Cumulative import time allowed for ``server``, in microseconds
+IMPORT_TIME_BUDGET_US = int(os.environ.get("IMPORT_TIME_BUDGET_US", "1500000"))
+
+
+def import_server():
+    """Import ``server`` in a fresh interpreter; return {module: cumulative microseconds}."""
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "import_time_test")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        timings[module.strip()] = int(cumulative)
+    return timings
+
+
+@pytest.fixture(scope="module")
+def timings():
+    return import_server()
+
+
+def test_heavy_modules_are_deferred(timings):
+    imported = {module.split(".")[0] for module in timings}
+    assert not imported.intersection(DEFERRED_MODULES)
+
+
+def test_server_import_within_budget(timings):
+    assert timings["server"] <= IMPORT_TIME_BUDGET_US, (
+        f"importing server took {timings['server'] / 1000:.0f} ms "
+        f"(budget {IMPORT_TIME_BUDGET_US / 1000:.0f} ms)"
+    )
@@ -0,0 +1,19 @@
+"""Keyset cursors of the machine list."""
+import pytest
+
+
+def test_cursor_round_trips_the_sort_key(server):
+    machine = {"id": "3f2a-1", "name_lower": "press \"7\" / ü"}
+    cursor = server.encode_machine_cursor(machine)
+
+    assert "=" not in cursor
+    assert server.decode_machine_cursor(cursor) == [machine["name_lower"], machine["id"]]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24", "WzFd", ""])
+def test_malformed_cursor_is_a_400(server, cursor):
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as excinfo:
+        server.decode_machine_cursor(cursor)
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,41 @@
+"""Vectorised OEE against hand-computed values."""
+import numpy as np
+import pytest
+
+
+def test_scalar_arguments_broadcast_over_records(server):
+    result = server.calculate_oee_batch(
+        output=[900.0, 1000.0, 1100.0],
+        downtime=[48.0, 0.0, 600.0],
+        efficiency=[90.0, 120.0, 50.0],
+        quality_rate=0.95,
+        planned_production_time=480.0,
+    )
+
+    # availability = (480 - downtime) / 480, floored at 0; performance = efficiency / 100, capped at 1
+    np.testing.assert_allclose(result["availability"], [90.0, 100.0, 0.0])
+    np.testing.assert_allclose(result["performance"], [90.0, 100.0, 50.0])
+    np.testing.assert_allclose(result["quality"], [95.0, 95.0, 95.0])
+    np.testing.assert_allclose(result["oee"], [76.95, 95.0, 0.0])
+
+
+def test_planned_production_time_per_machine(server):
+    result = server.calculate_oee_batch(
+        output=[500.0, 500.0],
+        downtime=[60.0, 60.0],
+        efficiency=80.0,
+        quality_rate=[1.0, 0.9],
+        planned_production_time=[480.0, 960.0],
+    )
+
+    np.testing.assert_allclose(result["availability"], [87.5, 93.75])
+    np.testing.assert_allclose(result["oee"], [70.0, 67.5])
+
+
+def test_scalars_give_zero_dimensional_results(server):
+    result = server.calculate_oee_batch(1000.0, 120.0, 75.0)
+
+    assert result["oee"].shape == ()
+    assert float(result["availability"]) == pytest.approx(
+        (server.DEFAULT_PLANNED_PRODUCTION_TIME - 120.0) / server.DEFAULT_PLANNED_PRODUCTION_TIME * 100, abs=0.01
+    )
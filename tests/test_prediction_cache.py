@@ -0,0 +1,51 @@
+"""LRU forecast cache and the keys that invalidate its entries."""
+from datetime import date, datetime, timedelta
+
+from feature_store import FeatureStore
+from hot_store import HotProductionStore
+from prediction_cache import PredictionCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", [{"day": 1}])
+    cache.put("b", [{"day": 2}])
+    assert cache.get("a") == [{"day": 1}]
+
+    cache.put("c", [{"day": 3}])
+    assert cache.get("b") is None
+    assert cache.get("a") == [{"day": 1}]
+    assert cache.get("c") == [{"day": 3}]
+
+
+def test_putting_an_existing_key_replaces_it_without_growing():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", [{"day": 1}])
+    cache.put("a", [{"day": 2}])
+    cache.put("b", [])
+
+    assert cache.get("a") == [{"day": 2}]
+    assert cache.get("b") == []
+
+
+def test_new_production_data_changes_the_key():
+    hot = HotProductionStore(window_days=60)
+    store = FeatureStore(hot)
+    today = date.today()
+
+    def add(offset, output):
+        hot.add([{"id": f"p{offset}", "machine_id": "m1", "date": (today - timedelta(days=offset)).isoformat(),
+                  "created_at": datetime(2026, 1, 1), "output": output, "downtime": 20.0,
+                  "efficiency": 80.0, "oee": 60.0}])
+        return store.refresh_snapshots(["m1"])[0]["watermark"]
+
+    for offset in range(10, 1, -1):
+        watermark = add(offset, 900.0)
+    cache = PredictionCache()
+    issued_on = today.isoformat()
+    cache.put(("m1", 7, "v1", watermark, issued_on), [{"predicted_efficiency": 80.0}])
+
+    # Same inputs hit; a retrain or a new record misses
+    assert cache.get(("m1", 7, "v1", store.refresh_snapshots(["m1"])[0]["watermark"], issued_on)) is not None
+    assert cache.get(("m1", 7, "v2", watermark, issued_on)) is None
+    assert cache.get(("m1", 7, "v1", add(1, 1000.0), issued_on)) is None
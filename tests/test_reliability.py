@@ -0,0 +1,55 @@
+"""MTBF/MTTR and availability derived from a machine's reliability counters."""
+import pytest
+
+from reliability import derive_metrics, fleet_summary
+
+
+def test_operating_time_counts_production_days_not_records():
+    counters = {"machine_id": "m1", "production_days": 10, "records": 40, "downtime_minutes": 600,
+                "failures": 2, "repair_hours": 4.0}
+    metrics = derive_metrics(counters, planned_production_time=480.0)
+
+    # 10 days x 8 h, minus 10 h of downtime
+    assert metrics["operating_hours"] == 70.0
+    assert metrics["mtbf_hours"] == 35.0
+    assert metrics["mttr_hours"] == 2.0
+    assert metrics["failure_rate_per_1000h"] == pytest.approx(2 / 70 * 1000, abs=1e-4)
+    assert metrics["availability"] == pytest.approx(35 / 37, abs=1e-4)
+
+
+def test_without_failures_mtbf_is_the_observed_operating_time():
+    metrics = derive_metrics({"machine_id": "m1", "production_days": 3}, planned_production_time=480.0)
+
+    assert metrics["failures"] == 0
+    assert metrics["mtbf_hours"] == 24.0
+    assert metrics["mttr_hours"] == 0.0
+    assert metrics["availability"] == 1.0
+
+
+def test_empty_counters_report_zeros():
+    metrics = derive_metrics({"machine_id": "m1"}, planned_production_time=480.0)
+
+    assert metrics["operating_hours"] == 0.0
+    assert metrics["failure_rate_per_1000h"] == 0.0
+    assert metrics["availability"] == 0.0
+    assert metrics["maintenance_events"] == 0
+    assert metrics["last_failure_date"] is None
+
+
+def test_downtime_beyond_planned_time_does_not_go_negative():
+    metrics = derive_metrics({"production_days": 1, "downtime_minutes": 1000}, planned_production_time=480.0)
+
+    assert metrics["operating_hours"] == 0.0
+
+
+def test_fleet_summary_pools_machines_with_their_planned_times():
+    rows = [
+        {"machine_id": "a", "production_days": 10, "failures": 1, "repair_hours": 2.0},
+        {"machine_id": "b", "production_days": 10, "failures": 1, "repair_hours": 4.0},
+    ]
+    summary = fleet_summary(rows, {"a": 480.0}, default_planned_time=240.0)
+
+    assert summary["machines"] == 2
+    assert summary["operating_hours"] == 120.0
+    assert summary["mtbf_hours"] == 60.0
+    assert summary["mttr_hours"] == 3.0
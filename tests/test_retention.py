@@ -0,0 +1,134 @@
+"""Parquet archives, monthly rollups and the compaction of old production months."""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from retention import _next_month, compact, month_rollup, parse_day, read_archive, write_part  # noqa: E402
+
+OPERATORS = {
+    "$lt": lambda value, bound: value < bound,
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$in": lambda value, bound: value in bound,
+}
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, bound in condition.items():
+            # MongoDB only compares values of the same type
+            if operator != "$in" and type(value) is not type(bound):
+                return False
+            if not OPERATORS[operator](value, bound):
+                return False
+    return True
+
+
+class Collection:
+    """Just enough of a motor collection for :func:`retention.compact`."""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.written = []
+
+    async def find_one(self, query, projection, sort):
+        found = sorted((doc for doc in self.docs if matches(doc, query)), key=lambda doc: doc[sort[0][0]])
+        return dict(found[0]) if found else None
+
+    def find(self, query, projection):
+        found = [dict(doc) for doc in self.docs if matches(doc, query)]
+
+        async def to_list(length):
+            return found
+        return SimpleNamespace(batch_size=lambda size: SimpleNamespace(to_list=to_list))
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not matches(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def bulk_write(self, operations, ordered):
+        self.written.extend(operations)
+
+
+def row(record_id, day, machine_id="m1", output=100.0, created_at=datetime(2020, 1, 1, 8, 0)):
+    return {"id": record_id, "machine_id": machine_id, "date": day, "output": output, "downtime": 10.0,
+            "efficiency": 80.0, "oee": 60.0, "quality_rate": 1.0, "availability": 0.9, "performance": 0.8,
+            "created_at": created_at}
+
+
+def test_parse_day_accepts_iso_days_only():
+    assert parse_day("2024-02-29") == date(2024, 2, 29)
+    assert parse_day("2024-02-29T10:00:00") == date(2024, 2, 29)
+    assert parse_day("2023-02-29") is None
+    assert parse_day("2024-13-01") is None
+    assert parse_day("01/05/2024") is None
+    assert parse_day("2024-1-5") is None
+    assert parse_day(None) is None
+
+
+def test_next_month_rolls_over_the_year():
+    assert _next_month(date(2024, 1, 1)) == date(2024, 2, 1)
+    assert _next_month(date(2024, 1, 31)) == date(2024, 2, 1)
+    assert _next_month(date(2024, 12, 1)) == date(2025, 1, 1)
+
+
+def test_rollup_counts_a_part_written_twice_once(tmp_path):
+    rows = [row("a", "2020-01-02"), row("b", "2020-01-02", output=50.0), row("c", "2020-01-05"),
+            row("d", "2020-01-03", machine_id="m2")]
+    write_part(tmp_path, "2020-01", rows)
+    # A crash after writing the part but before deleting the rows writes it again
+    write_part(tmp_path, "2020-01", rows[:3])
+
+    rollups = {rollup["machine_id"]: rollup for rollup in month_rollup(tmp_path, "2020-01")}
+    assert rollups["m1"]["records"] == 3
+    assert rollups["m1"]["days"] == 2
+    assert rollups["m1"]["output_sum"] == 250.0
+    assert rollups["m1"]["average_output"] == pytest.approx(250.0 / 3, abs=1e-4)
+    assert (rollups["m1"]["first_date"], rollups["m1"]["last_date"]) == ("2020-01-02", "2020-01-05")
+    assert rollups["m2"]["records"] == 1
+    assert month_rollup(tmp_path, "2020-02") == []
+
+
+def test_read_archive_filters_dedupes_and_returns_naive_utc(tmp_path):
+    aware = datetime(2020, 2, 1, 6, 0, tzinfo=timezone.utc)
+    write_part(tmp_path, "2020-01", [row("a", "2020-01-30"), row("b", "2020-01-31", machine_id="m2")])
+    write_part(tmp_path, "2020-02", [row("c", "2020-02-01", created_at=aware), row("d", "2020-02-03")])
+    write_part(tmp_path, "2020-02", [row("c", "2020-02-01", created_at=aware)])
+
+    rows = read_archive(tmp_path, "2020-01-31", "2020-02-02")
+    assert [r["id"] for r in rows] == ["b", "c"]
+    assert rows[1]["created_at"] == datetime(2020, 2, 1, 6, 0)
+    assert [r["id"] for r in read_archive(tmp_path, machine_id="m1")] == ["a", "c", "d"]
+    assert len(read_archive(tmp_path, limit=2)) == 2
+    assert read_archive(tmp_path / "missing") == []
+
+
+def test_compact_archives_whole_old_months_and_skips_malformed_dates(tmp_path):
+    recent = (date.today() - timedelta(days=1)).isoformat()
+    production = Collection([
+        row("a", "2020-01-05"), row("b", "2020-01-20"), row("c", "2020-03-01"),
+        row("bad-format", "05/01/2020"), row("bad-day", "2020-01-5"), row("bad-month", "2020-13-45"),
+        row("recent", recent),
+    ])
+    db = SimpleNamespace(production_data=production, production_monthly=Collection())
+
+    summary = asyncio.run(compact(db, tmp_path, retain_days=30))
+    assert summary["months"] == ["2020-01", "2020-03"]
+    assert summary["archived"] == summary["deleted"] == 3
+    assert summary["skipped"] == 2
+    assert sorted(doc["id"] for doc in production.docs) == ["bad-day", "bad-format", "bad-month", "recent"]
+    assert [r["id"] for r in read_archive(tmp_path)] == ["a", "b", "c"]
+    assert len(db.production_monthly.written) == 2
+
+    again = asyncio.run(compact(db, tmp_path, retain_days=30))
+    assert again["archived"] == 0 and again["months"] == []
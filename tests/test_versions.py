@@ -0,0 +1,50 @@
+"""Weak ETags of the polled endpoints and If-None-Match matching."""
+import asyncio
+from datetime import datetime, timedelta
+
+from versions import WriteVersions, etag, machine_keys, matches
+
+MOMENT = datetime(2026, 1, 2, 3, 4, 5, 678000)
+
+
+def test_etag_is_weak_and_stable_across_parameter_order():
+    tag = etag("trends", MOMENT, days=30, machine_id="m1")
+
+    assert tag.startswith('W/"') and tag.endswith('"')
+    assert tag == etag("trends", MOMENT, machine_id="m1", days=30)
+
+
+def test_etag_changes_with_scope_time_and_parameters():
+    tag = etag("trends", MOMENT, days=30)
+
+    assert etag("dashboard", MOMENT, days=30) != tag
+    assert etag("trends", MOMENT + timedelta(milliseconds=1), days=30) != tag
+    assert etag("trends", MOMENT, days=7) != tag
+
+
+def test_matches_uses_weak_comparison():
+    tag = etag("predictions", MOMENT, machine_id="m1")
+    opaque = tag[2:]
+
+    assert matches(tag, tag)
+    assert matches(opaque, tag)
+    assert matches(f'"other", {tag}', tag)
+    assert matches("*", tag)
+    assert not matches(None, tag)
+    assert not matches("", tag)
+    assert not matches('W/"other"', tag)
+
+
+def test_local_versions_track_the_newest_write_per_key():
+    async def scenario():
+        tracker = WriteVersions()
+        later = tracker.since + timedelta(minutes=5)
+        await tracker.touch("predictions", machine_ids=["m1"], at=later)
+        return tracker, later, (
+            await tracker.last_modified(machine_keys("predictions", "m1")),
+            await tracker.last_modified(machine_keys("predictions", "m2")),
+        )
+
+    tracker, later, (touched, untouched) = asyncio.run(scenario())
+    assert touched == later
+    assert untouched == tracker.since